@@ -0,0 +1,70 @@
+"""
+K 线响应序列化基准：FastAPI 默认路径（jsonable_encoder + JSONResponse） vs FastJSONResponse
+
+用法: python bench/bench_json_response.py [--bars 1000] [--repeat 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import responses  # noqa: E402
+from bench_kline_format import make_frame  # noqa: E402
+from kline_format import frame_to_klines  # noqa: E402
+
+
+def default_path(payload: dict) -> bytes:
+    """改造前：路由返回 dict，FastAPI 先 jsonable_encoder 再 json.dumps"""
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def stdlib_path(payload: dict) -> bytes:
+    """FastJSONResponse 未装 orjson 时的回退路径"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(payload: dict) -> bytes:
+    return responses.FastJSONResponse(payload).body
+
+
+def best_of(fn, payload, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    klines = frame_to_klines(make_frame(args.bars))
+    payload = {"source": "futu", "symbol": "SPY.US", "ktype": "K_1M", "count": len(klines), "data": klines}
+    assert json.loads(default_path(payload)) == json.loads(fast_path(payload)), "序列化结果不一致"
+
+    base = best_of(default_path, payload, args.repeat)
+    print(f"bars={args.bars} backend={responses.JSON_BACKEND}")
+    print(f"{'path':<36} {'ms':>8} {'speedup':>8}")
+    for name, fn in (
+        ("jsonable_encoder + JSONResponse", default_path),
+        ("FastJSONResponse (stdlib json)", stdlib_path),
+        (f"FastJSONResponse ({responses.JSON_BACKEND})", fast_path),
+    ):
+        ms = best_of(fn, payload, args.repeat)
+        print(f"{name:<36} {ms:>8.3f} {base / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+K 线格式化微基准：逐行 format_kline_row（旧实现） vs 列式 frame_to_klines
+同时校验两者 JSON 输出逐字节一致。
+
+用法: python bench/bench_kline_format.py [--rows 100,1000,10000] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kline_format import frame_to_klines  # noqa: E402
+
+
+def format_kline_row(row: dict) -> dict:
+    """旧实现（逐行），作为对照基线"""
+    time_key = row.get("time_key", "")
+    if isinstance(time_key, str) and time_key:
+        try:
+            ts = int(datetime.strptime(time_key, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+        except ValueError:
+            try:
+                ts = int(datetime.strptime(time_key, "%Y-%m-%d").timestamp() * 1000)
+            except ValueError:
+                ts = 0
+    else:
+        ts = 0
+
+    return {
+        "timestamp": ts,
+        "open": float(row.get("open", 0)),
+        "high": float(row.get("high", 0)),
+        "low": float(row.get("low", 0)),
+        "close": float(row.get("close", 0)),
+        "volume": int(row.get("volume", 0)),
+        "turnover": float(row.get("turnover", 0)),
+    }
+
+
+def legacy(df: pd.DataFrame) -> list[dict]:
+    return [format_kline_row(r) for r in df.to_dict("records")]
+
+
+def make_frame(n: int) -> pd.DataFrame:
+    """模拟 request_history_kline 返回的 1min K 线 DataFrame"""
+    rng = np.random.default_rng(42)
+    idx = pd.date_range("2026-03-02 09:31:00", periods=n, freq="1min")
+    close = 500 + rng.standard_normal(n).cumsum()
+    return pd.DataFrame({
+        "code": "US.SPY",
+        "time_key": idx.strftime("%Y-%m-%d %H:%M:%S").astype(object),
+        "open": close + rng.standard_normal(n) * 0.1,
+        "close": close,
+        "high": close + rng.random(n),
+        "low": close - rng.random(n),
+        "pe_ratio": 0.0,
+        "turnover_rate": 0.0,
+        "volume": rng.integers(1_000, 1_000_000, n),
+        "turnover": close * 1000.123,
+        "change_rate": 0.0,
+        "last_close": close,
+    })
+
+
+def best_of(fn, df, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # 边界行：日期格式 / 空串 / 非法值也必须一致
+    edge = make_frame(4)
+    edge["time_key"] = ["2026-03-02", "", "bad", "2026-03-02 09:31:00"]
+    assert json.dumps(legacy(edge)) == json.dumps(frame_to_klines(edge)), "边界行输出不一致"
+
+    print(f"{'rows':>8} {'legacy ms':>12} {'columnar ms':>12} {'speedup':>8}")
+    for n in (int(x) for x in args.rows.split(",")):
+        df = make_frame(n)
+        assert json.dumps(legacy(df)) == json.dumps(frame_to_klines(df)), f"{n} 行输出不一致"
+        old = best_of(legacy, df, args.repeat)
+        new = best_of(frame_to_klines, df, args.repeat)
+        print(f"{n:>8} {old:>12.3f} {new:>12.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
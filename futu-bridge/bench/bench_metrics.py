@@ -0,0 +1,80 @@
+"""
+指标中间件开销压测
+直接以 ASGI 方式调用一个立即返回的最小 FastAPI 路由（不经过网络栈），
+比较挂 MetricsMiddleware 前后每个请求的平均耗时，差值即常开指标的额外开销。
+同时给出一次 /metrics 渲染（--routes 条路由 × 3 个分段直方图）的耗时。
+
+用法: python bench/bench_metrics.py [--requests 20000] [--routes 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+
+from metrics import MetricsMiddleware, MetricsRegistry, RequestTiming  # noqa: E402
+from responses import FastJSONResponse  # noqa: E402
+
+
+def build_app(registry: MetricsRegistry | None) -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/kline")
+    async def kline():
+        return FastJSONResponse({"symbol": "AAPL.US", "count": 0, "data": []})
+
+    if registry is not None:
+        app.add_middleware(MetricsMiddleware, registry=registry)
+    return app
+
+
+async def drive(app, requests: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/kline", "raw_path": b"/kline", "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    # 预热（构建中间件栈）
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+    t0 = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - t0) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--routes", type=int, default=20)
+    args = parser.parse_args()
+
+    base = asyncio.run(drive(build_app(None), args.requests))
+    registry = MetricsRegistry()
+    with_metrics = asyncio.run(drive(build_app(registry), args.requests))
+    print(f"无指标:   {base * 1e6:8.2f} µs/请求")
+    print(f"挂指标:   {with_metrics * 1e6:8.2f} µs/请求  额外 {(with_metrics - base) * 1e6:+.2f} µs")
+
+    timing = RequestTiming()
+    for i in range(args.routes):
+        for _ in range(100):
+            registry.observe_request(f"/route{i}", "GET", 200, 0.01, timing)
+    t0 = time.perf_counter()
+    text = registry.render([])
+    print(f"/metrics 渲染（{args.routes} 条路由）: {(time.perf_counter() - t0) * 1000:.2f} ms  {len(text)} 字节")
+
+
+if __name__ == "__main__":
+    main()
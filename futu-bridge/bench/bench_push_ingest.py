@@ -0,0 +1,137 @@
+"""
+实时 K 线推送写入压测：旧 iterrows 逐行处理 vs RealtimeKlines.ingest 列式整块写入
+按给定速率重放推送（每次推送为一个标的的一根在途 K 线，与 FutuOpenD 1min K 推送一致），
+统计可达吞吐、单次推送处理耗时分位数，以及同一 time_key 重复推送后的缓冲行数。
+
+--batch N 把连续 N 次推送合并为一个多行 DataFrame，用于覆盖列式转换路径。
+
+用法: python bench/bench_push_ingest.py [--symbols 200] [--pushes 20000] [--rate 5000] [--batch 1]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from realtime_buffer import RealtimeKlines  # noqa: E402
+
+BUFFER_MAX = 120
+
+
+class LegacyBuffers:
+    """改造前 KlineHandler.on_recv_rsp 的写入逻辑"""
+
+    def __init__(self):
+        self.buffers: dict[str, deque] = {}
+        self.lock = threading.Lock()
+
+    def ingest(self, data: pd.DataFrame):
+        for _, row in data.iterrows():
+            code = row.get("code", "")
+            time_key = row.get("time_key", "")
+            try:
+                ts = int(datetime.strptime(time_key, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+            except (ValueError, TypeError):
+                ts = int(time.time() * 1000)
+            bar = {
+                "timestamp": ts,
+                "open": float(row.get("open", 0)),
+                "high": float(row.get("high", 0)),
+                "low": float(row.get("low", 0)),
+                "close": float(row.get("close", 0)),
+                "volume": int(row.get("volume", 0)),
+                "turnover": float(row.get("turnover", 0)),
+            }
+            with self.lock:
+                if code not in self.buffers:
+                    self.buffers[code] = deque(maxlen=BUFFER_MAX)
+                self.buffers[code].append(bar)
+
+    def rows(self) -> int:
+        return sum(len(b) for b in self.buffers.values())
+
+
+class NewBuffers(RealtimeKlines):
+    def __init__(self):
+        super().__init__(BUFFER_MAX)
+
+    def rows(self) -> int:
+        return sum(self.stats()["depth"].values())
+
+
+def make_pushes(symbols: int, pushes: int, batch: int = 1) -> list[pd.DataFrame]:
+    """每个标的每分钟约推送 pushes/symbols/minutes 次，time_key 相同的推送应被覆盖"""
+    rng = np.random.default_rng(7)
+    codes = [f"US.S{i:04d}" for i in range(symbols)]
+    per_minute = max(pushes // symbols // 30, 1)
+    frames = []
+    for i in range(pushes):
+        code = codes[i % symbols]
+        minute = (i // symbols) // per_minute
+        price = 100 + rng.standard_normal()
+        frames.append(pd.DataFrame({
+            "code": [code],
+            "time_key": [f"2026-03-02 {9 + (31 + minute) // 60:02d}:{(31 + minute) % 60:02d}:00"],
+            "open": [price], "close": [price], "high": [price + 0.1], "low": [price - 0.1],
+            "volume": [int(rng.integers(1, 10_000))], "turnover": [price * 1000],
+            "k_type": ["K_1M"], "last_close": [price],
+        }))
+    if batch > 1:
+        frames = [pd.concat(frames[i:i + batch], ignore_index=True) for i in range(0, len(frames), batch)]
+    return frames
+
+
+def replay(buffers, frames: list[pd.DataFrame], rate: float) -> dict:
+    """rate<=0 时全速重放；否则按固定速率重放，统计处理耗时与落后量"""
+    lat = np.empty(len(frames))
+    interval = 1.0 / rate if rate > 0 else 0.0
+    start = time.perf_counter()
+    max_lag = 0.0
+    for i, df in enumerate(frames):
+        due = start + i * interval
+        now = time.perf_counter()
+        if now < due:
+            time.sleep(due - now)
+        else:
+            max_lag = max(max_lag, now - due)
+        t0 = time.perf_counter()
+        buffers.ingest(df)
+        lat[i] = time.perf_counter() - t0
+    elapsed = time.perf_counter() - start
+    return {
+        "pushes_per_s": len(frames) / elapsed,
+        "p50_us": float(np.percentile(lat, 50) * 1e6),
+        "p99_us": float(np.percentile(lat, 99) * 1e6),
+        "max_lag_ms": max_lag * 1000 if rate > 0 else float("nan"),
+        "rows": buffers.rows(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--pushes", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=5000, help="重放速率（次/秒），0 为全速")
+    parser.add_argument("--batch", type=int, default=1, help="每次推送包含的行数")
+    args = parser.parse_args()
+
+    frames = make_pushes(args.symbols, args.pushes, args.batch)
+    print(f"symbols={args.symbols} pushes={len(frames)} rows/push={args.batch}")
+    print(f"{'impl':<8} {'mode':<10} {'pushes/s':>10} {'p50 us':>8} {'p99 us':>8} {'max lag ms':>11} {'rows':>7}")
+    for mode, rate in (("max", 0.0), (f"{args.rate:g}/s", args.rate)):
+        for name, cls in (("legacy", LegacyBuffers), ("columnar", NewBuffers)):
+            r = replay(cls(), frames, rate)
+            print(f"{name:<8} {mode:<10} {r['pushes_per_s']:>10.0f} {r['p50_us']:>8.1f} {r['p99_us']:>8.1f} "
+                  f"{r['max_lag_ms']:>11.1f} {r['rows']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+行情连接池分派压测
+用假连接模拟单条连接上的请求串行（每次调用持连接锁 --call-ms 毫秒），
+并发发起 --requests 个调用，比较不同连接数下的总耗时与各连接分到的调用数。
+只衡量分派与并行度，不涉及 FutuOpenD 本身的处理能力。
+
+用法: python bench/bench_quote_pool.py [--requests 64] [--call-ms 20] [--sizes 1,2,4]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from futu import RET_OK  # noqa: E402
+
+from executor import FutuExecutor  # noqa: E402
+from quote_pool import QuotePool  # noqa: E402
+
+
+class SerialCtx:
+    status = "READY"
+
+    def __init__(self, call_ms: float):
+        self.call_ms = call_ms
+        self._lock = threading.Lock()
+
+    def query(self):
+        with self._lock:
+            time.sleep(self.call_ms / 1000)
+        return RET_OK, None
+
+    def close(self):
+        pass
+
+
+async def run(size: int, requests: int, call_ms: float) -> tuple[float, list[int]]:
+    pool = QuotePool(lambda: SerialCtx(call_ms), size, fail_threshold=3, cooldown=10)
+    executor = FutuExecutor(workers=16, limits={}, default_limit=16, queue_max=requests)
+
+    async def one():
+        slot = pool.pick()
+        result = await executor.run("bench", pool.call, slot, "query")
+        pool.release(slot, result)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - t0
+    executor.shutdown()
+    return elapsed, [c["calls"] for c in pool.stats()["connections"]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--call-ms", type=float, default=20)
+    parser.add_argument("--sizes", default="1,2,4")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        elapsed, calls = asyncio.run(run(size, args.requests, args.call_ms))
+        print(f"connections={size}: {elapsed * 1000:8.1f} ms  {args.requests / elapsed:7.1f} req/s  calls={calls}")
+
+
+if __name__ == "__main__":
+    main()
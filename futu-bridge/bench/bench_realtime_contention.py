@@ -0,0 +1,130 @@
+"""
+实时缓冲读写争用压测：全局锁 vs 按标的加锁 + 版本号无锁读取
+一个写入线程按给定速率重放推送（模拟 FutuOpenD 回调线程），多个读取线程不停读取随机标的，
+统计写入方单次推送耗时分位数 / 最大落后量，以及读取吞吐。
+
+"global" 复现改造前的行为：推送写入与读取（含 dict 转换）共用一把全局锁。
+HTTP 读取都在事件循环线程上，默认 1 个读取线程；读取线程多于 1 个时写入方延迟主要受 GIL 切换支配，
+两种实现差别不大。
+
+用法: python bench/bench_realtime_contention.py [--symbols 200] [--readers 1] [--limit 0] [--rate 5000] [--seconds 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_push_ingest import make_pushes  # noqa: E402
+from realtime_buffer import RealtimeKlines  # noqa: E402
+
+DEPTH = 1000
+
+
+class GlobalLockKlines(RealtimeKlines):
+    """写入与读取转换都在同一把锁内"""
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._global = threading.Lock()
+
+    def ingest(self, data):
+        with self._global:
+            return super().ingest(data)
+
+    def read(self, code, since=None, limit=None):
+        with self._global:
+            return super().read(code, since, limit)
+
+
+def prefill(buffers: RealtimeKlines, codes: list[str]):
+    """每个标的灌入 DEPTH 根早于重放推送的 K 线，读取方每次拿到完整深度"""
+    keys = pd.date_range(end="2026-03-02 09:30:00", periods=DEPTH, freq="min").strftime("%Y-%m-%d %H:%M:%S")
+    for code in codes:
+        buffers.ingest(pd.DataFrame({
+            "code": code, "time_key": keys, "open": 100.0, "close": 100.0, "high": 100.1, "low": 99.9,
+            "volume": 1000, "turnover": 100000.0, "k_type": "K_1M",
+        }))
+
+
+def run(buffers: RealtimeKlines, frames, codes: list[str], readers: int, limit: int | None,
+        rate: float, seconds: float) -> dict:
+    prefill(buffers, codes)
+    stop = threading.Event()
+    reads = [0] * readers
+
+    def reader(i: int):
+        rng = random.Random(i)
+        while not stop.is_set():
+            buffers.read(rng.choice(codes), limit=limit)
+            reads[i] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,), daemon=True) for i in range(readers)]
+    for t in threads:
+        t.start()
+
+    interval = 1.0 / rate
+    lat = []
+    max_lag = 0.0
+    start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - start < seconds:
+        due = start + i * interval
+        now = time.perf_counter()
+        if now < due:
+            time.sleep(due - now)
+        else:
+            max_lag = max(max_lag, now - due)
+        t0 = time.perf_counter()
+        buffers.ingest(frames[i % len(frames)])
+        lat.append(time.perf_counter() - t0)
+        i += 1
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in threads:
+        t.join()
+
+    lat = np.array(lat)
+    return {
+        "pushes_per_s": i / elapsed,
+        "p50_us": float(np.percentile(lat, 50) * 1e6),
+        "p99_us": float(np.percentile(lat, 99) * 1e6),
+        "max_us": float(lat.max() * 1e6),
+        "max_lag_ms": max_lag * 1000,
+        "reads_per_s": sum(reads) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=0, help="每次读取最近 N 根，0 为整个缓冲")
+    parser.add_argument("--rate", type=float, default=5000, help="推送速率（次/秒）")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    frames = make_pushes(args.symbols, args.symbols * 60)
+    codes = [f"US.S{i:04d}" for i in range(args.symbols)]
+    print(f"symbols={args.symbols} readers={args.readers} limit={args.limit or DEPTH} "
+          f"rate={args.rate:g}/s seconds={args.seconds:g}")
+    print(f"{'impl':<10} {'pushes/s':>9} {'p50 us':>8} {'p99 us':>8} {'max us':>9} {'max lag ms':>11} {'reads/s':>9}")
+    for name, cls in (("global", GlobalLockKlines), ("per-symbol", RealtimeKlines)):
+        buffers = cls(DEPTH)
+        r = run(buffers, frames, codes, args.readers, args.limit or None, args.rate, args.seconds)
+        print(f"{name:<10} {r['pushes_per_s']:>9.0f} {r['p50_us']:>8.1f} {r['p99_us']:>8.1f} {r['max_us']:>9.1f} "
+              f"{r['max_lag_ms']:>11.1f} {r['reads_per_s']:>9.0f}")
+        if name == "per-symbol":
+            s = buffers.stats()
+            print(f"{'':<10} reads={s['reads']} read_fallbacks={s['read_fallbacks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+实时 K 线缓冲内存与读取压测：deque[dict] vs KlineRing
+按给定标的数与深度灌满缓冲，比较常驻内存，以及读取全部 / 最近 N 根 / since 查询的耗时
+（逐行 dict 输出），和最近 N 根按列输出（columnar / msgpack 响应）的耗时。
+
+用法: python bench/bench_ring_buffer.py [--symbols 300] [--depth 1000] [--tail 120]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ring_buffer import KlineRing, view_to_columns, view_to_klines  # noqa: E402
+from wire_format import klines_to_columns  # noqa: E402
+
+
+def make_bar(i: int) -> dict:
+    price = 100.0 + (i % 97) * 0.01
+    return {
+        "timestamp": 1772443800000 + i * 60_000,
+        "open": price, "high": price + 0.1, "low": price - 0.1, "close": price,
+        "volume": 1000 + i, "turnover": price * (1000 + i),
+    }
+
+
+def fill(kind: str, symbols: int, depth: int) -> tuple[dict, int]:
+    tracemalloc.start()
+    buffers = {}
+    for s in range(symbols):
+        if kind == "deque":
+            buf = deque(maxlen=depth)
+            for i in range(depth):
+                buf.append(make_bar(i))
+        else:
+            buf = KlineRing(depth)
+            for i in range(depth):
+                buf.upsert(make_bar(i))
+        buffers[f"US.S{s:04d}"] = buf
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return buffers, size
+
+
+def timeit(fn, repeat: int = 200) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--depth", type=int, default=1000)
+    parser.add_argument("--tail", type=int, default=120, help="最近 N 根 / since 查询返回的根数")
+    args = parser.parse_args()
+
+    since = make_bar(args.depth - args.tail)["timestamp"]
+    print(f"symbols={args.symbols} depth={args.depth} tail={args.tail}")
+    print(f"{'impl':<6} {'MB':>8} {'B/bar':>7} {'full us':>9} {'tail us':>9} {'since us':>9} {'cols us':>8}")
+    for kind in ("deque", "ring"):
+        buffers, size = fill(kind, args.symbols, args.depth)
+        buf = buffers["US.S0000"]
+        if kind == "deque":
+            full = lambda: list(buf)  # noqa: E731
+            tail = lambda: list(buf)[-args.tail:]  # noqa: E731
+            by_ts = lambda: [b for b in buf if b["timestamp"] >= since]  # noqa: E731
+            cols = lambda: klines_to_columns(list(buf)[-args.tail:])  # noqa: E731
+        else:
+            full = lambda: view_to_klines(buf.window())  # noqa: E731
+            tail = lambda: view_to_klines(buf.since(limit=args.tail))  # noqa: E731
+            by_ts = lambda: view_to_klines(buf.since(since))  # noqa: E731
+            cols = lambda: view_to_columns(buf.since(limit=args.tail))  # noqa: E731
+        assert len(by_ts()) == args.tail
+        print(f"{kind:<6} {size / 2**20:>8.1f} {size / (args.symbols * args.depth):>7.0f} "
+              f"{timeit(full):>9.1f} {timeit(tail):>9.1f} {timeit(by_ts):>9.1f} {timeit(cols):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+FutuOpenD 阻塞调用执行层
+OpenQuoteContext 的方法都是同步阻塞的，直接在 async 路由里调用会卡住整个事件循环。
+这里用独立线程池承载这些调用，按端点限制并发，并统计排队深度/耗时。
+"""
+
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(RuntimeError):
+    """端点排队已满，拒绝新请求（路由层转为 503）"""
+
+
+class EndpointLimiter:
+    """单个端点的并发闸门 + 统计"""
+
+    def __init__(self, name: str, limit: int, queue_max: int):
+        self.name = name
+        self.limit = limit
+        self.queue_max = queue_max
+        self.sem = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.total = 0
+        self.errors = 0
+        self.rejected = 0
+        self.wait_ms_total = 0.0
+        self.run_ms_total = 0.0
+
+    def stats(self) -> dict:
+        done = max(self.total, 1)
+        return {
+            "limit": self.limit,
+            "queue_max": self.queue_max,
+            "waiting": self.waiting,
+            "running": self.running,
+            "max_waiting": self.max_waiting,
+            "total": self.total,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_ms_total / done, 3),
+            "avg_run_ms": round(self.run_ms_total / done, 3),
+        }
+
+
+class FutuExecutor:
+    """把同步 FutuOpenD 调用派发到有界线程池，按端点限流"""
+
+    def __init__(self, workers: int, limits: dict[str, int], default_limit: int, queue_max: int):
+        self.workers = workers
+        self.default_limit = default_limit
+        self.queue_max = queue_max
+        self._limits = limits
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="futu-call")
+        self._limiters: dict[str, EndpointLimiter] = {}
+
+    @classmethod
+    def from_env(cls) -> "FutuExecutor":
+        """
+        FUTU_EXECUTOR_WORKERS: 线程池大小
+        FUTU_LIMIT_<ENDPOINT>: 端点并发上限，如 FUTU_LIMIT_KLINE=4
+        FUTU_QUEUE_MAX: 每个端点最大排队数，超出直接拒绝
+        """
+        workers = int(os.getenv("FUTU_EXECUTOR_WORKERS", "8"))
+        default_limit = int(os.getenv("FUTU_LIMIT_DEFAULT", "4"))
+        limits = {
+            "kline": int(os.getenv("FUTU_LIMIT_KLINE", "4")),
+            "snapshot": int(os.getenv("FUTU_LIMIT_SNAPSHOT", "4")),
+            "trading_days": int(os.getenv("FUTU_LIMIT_TRADING_DAYS", "2")),
+            "health": int(os.getenv("FUTU_LIMIT_HEALTH", "1")),
+            "subscribe": int(os.getenv("FUTU_LIMIT_SUBSCRIBE", "1")),
+        }
+        queue_max = int(os.getenv("FUTU_QUEUE_MAX", "64"))
+        return cls(workers, limits, default_limit, queue_max)
+
+    def _limiter(self, endpoint: str) -> EndpointLimiter:
+        lim = self._limiters.get(endpoint)
+        if lim is None:
+            limit = self._limits.get(endpoint, self.default_limit)
+            lim = EndpointLimiter(endpoint, limit, self.queue_max)
+            self._limiters[endpoint] = lim
+        return lim
+
+    def check(self, endpoint: str):
+        """endpoint 并发已满且排队已满时抛出 QueueFullError；调用方可在取频率令牌之前先行检查"""
+        lim = self._limiter(endpoint)
+        if lim.sem.locked() and lim.waiting >= lim.queue_max:
+            lim.rejected += 1
+            raise QueueFullError(f"{endpoint} 排队已满 ({lim.waiting}/{lim.queue_max})")
+
+    async def submit(self, endpoint: str, fn, *args, **kwargs) -> asyncio.Future:
+        """
+        等到 endpoint 有并发名额后把 fn(*args, **kwargs) 提交到线程池，返回其 Future。
+        名额与统计在线程上的调用真正结束时才归还（Future 的完成回调），
+        等待方被取消（客户端断开）不会让仍在执行的调用提前让出名额
+        """
+        lim = self._limiter(endpoint)
+        t0 = time.perf_counter()
+        if lim.sem.locked():
+            # 并发已满，进入排队
+            self.check(endpoint)
+            lim.waiting += 1
+            lim.max_waiting = max(lim.max_waiting, lim.waiting)
+            try:
+                await lim.sem.acquire()
+            finally:
+                lim.waiting -= 1
+        else:
+            await lim.sem.acquire()
+        t1 = time.perf_counter()
+
+        lim.running += 1
+
+        def _done(fut: asyncio.Future):
+            lim.running -= 1
+            lim.sem.release()
+            lim.total += 1
+            if not fut.cancelled() and fut.exception() is not None:
+                lim.errors += 1
+            lim.wait_ms_total += (t1 - t0) * 1000
+            lim.run_ms_total += (time.perf_counter() - t1) * 1000
+
+        try:
+            fut = asyncio.get_running_loop().run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            # 线程池已关闭等，调用没有提交出去
+            lim.running -= 1
+            lim.sem.release()
+            raise
+        fut.add_done_callback(_done)
+        return fut
+
+    async def run(self, endpoint: str, fn, *args, **kwargs):
+        """在线程池中执行 fn(*args, **kwargs)，受 endpoint 并发上限约束"""
+        fut = await self.submit(endpoint, fn, *args, **kwargs)
+        return await asyncio.shield(fut)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "endpoints": {name: lim.stats() for name, lim in self._limiters.items()},
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
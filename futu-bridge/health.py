@@ -0,0 +1,104 @@
+"""
+FutuOpenD 存活探测
+后台任务每 interval 秒调用一次 probe（get_global_state），缓存最近一次的结果、耗时与时间；
+/health 直接读内存，不再每次探活都向 FutuOpenD 发请求。
+结果超过 3 个探测周期未更新（探测任务卡住）时按失败处理。
+仅在事件循环线程内访问，无需加锁。
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+log = logging.getLogger("futu-bridge")
+
+
+class HealthProber:
+    def __init__(self, probe, interval: float, timeout: float):
+        """probe() 为协程，返回 FutuOpenD 全局状态 dict，失败时抛出异常"""
+        self._probe = probe
+        self.interval = interval
+        self.timeout = timeout
+        self.ok = False
+        self.state: dict | None = None
+        self.error: str | None = "尚未探测"
+        self.latency_ms: float | None = None
+        self.checked_at: float | None = None
+        self.failures = 0
+        self.probes = 0
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls, probe) -> "HealthProber":
+        """
+        HEALTH_PROBE_INTERVAL: 探测间隔（秒）
+        HEALTH_PROBE_TIMEOUT: 单次探测超时（秒）
+        """
+        return cls(
+            probe,
+            interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "5")),
+            timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "3")),
+        )
+
+    async def probe(self) -> bool:
+        """立即探测一次并更新缓存"""
+        t0 = time.perf_counter()
+        try:
+            state = await asyncio.wait_for(self._probe(), self.timeout)
+        except asyncio.TimeoutError:
+            self._record(False, None, f"探测超时 ({self.timeout:g}s)", t0)
+        except Exception as e:
+            self._record(False, None, str(e) or type(e).__name__, t0)
+        else:
+            self._record(True, state, None, t0)
+        return self.ok
+
+    def _record(self, ok: bool, state: dict | None, error: str | None, t0: float):
+        if ok != self.ok:
+            if ok:
+                log.info("FutuOpenD 探测恢复正常")
+            else:
+                log.warning(f"FutuOpenD 探测失败: {error}")
+        self.ok = ok
+        self.state = state
+        self.error = error
+        self.latency_ms = round((time.perf_counter() - t0) * 1000, 3)
+        self.checked_at = time.time()
+        self.probes += 1
+        self.failures = 0 if ok else self.failures + 1
+
+    async def _loop(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def healthy(self, now: float | None = None) -> bool:
+        if not self.ok or self.checked_at is None:
+            return False
+        return (now or time.time()) - self.checked_at <= self.interval * 3 + self.timeout
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        healthy = self.healthy(now)
+        error = self.error
+        if self.ok and not healthy:
+            error = f"探测结果已 {now - self.checked_at:.0f}s 未更新"
+        return {
+            "ok": healthy,
+            "error": error,
+            "latency_ms": self.latency_ms,
+            "checked_at": int(self.checked_at * 1000) if self.checked_at is not None else None,
+            "age_s": round(now - self.checked_at, 3) if self.checked_at is not None else None,
+            "consecutive_failures": self.failures,
+            "probes": self.probes,
+        }
@@ -0,0 +1,287 @@
+"""
+增量技术指标
+每个 (symbol, ktype) 维护 EMA / RSI / ATR / VWAP 的递推状态，每根新 K 线 O(1) 更新，不回看历史。
+同一根 K 线收线前会反复推送：只有 timestamp 前进时才把上一根提交进状态，
+在途的最后一根单独保存，读取时在状态副本上临时叠加，推送路径上不重复计算。
+RSI / ATR 用 Wilder 平滑，EMA / RSI / ATR 均以前 n 根的简单平均作为初值（与 TA-Lib 一致）；
+VWAP 为当日累计 turnover / volume，按 K 线当地日期重置。
+首次查询时用历史 K 线预热，之后只靠推送递推。
+"""
+
+import copy
+import os
+import threading
+import time
+from datetime import datetime
+
+
+class _Ema:
+    __slots__ = ("n", "alpha", "value", "_sum", "_count")
+
+    def __init__(self, n: int):
+        self.n = n
+        self.alpha = 2 / (n + 1)
+        self.value: float | None = None
+        self._sum = 0.0
+        self._count = 0
+
+    def update(self, bar: dict):
+        close = bar["close"]
+        if self._count < self.n:
+            self._sum += close
+            self._count += 1
+            if self._count == self.n:
+                self.value = self._sum / self.n
+        else:
+            self.value += self.alpha * (close - self.value)
+
+    def clone(self) -> "_Ema":
+        return copy.copy(self)
+
+
+class _Wilder:
+    """前 n 个样本取简单平均，之后 avg = (avg × (n-1) + x) / n"""
+    __slots__ = ("n", "avg", "_count")
+
+    def __init__(self, n: int):
+        self.n = n
+        self.avg: float | None = None
+        self._count = 0
+
+    def update(self, x: float):
+        if self._count < self.n:
+            self._count += 1
+            self.avg = (self.avg or 0.0) + x
+            if self._count == self.n:
+                self.avg /= self.n
+        else:
+            self.avg = (self.avg * (self.n - 1) + x) / self.n
+
+    @property
+    def ready(self) -> bool:
+        return self._count >= self.n
+
+
+class _Rsi:
+    __slots__ = ("n", "_prev", "_gain", "_loss")
+
+    def __init__(self, n: int):
+        self.n = n
+        self._prev: float | None = None
+        self._gain = _Wilder(n)
+        self._loss = _Wilder(n)
+
+    def update(self, bar: dict):
+        close = bar["close"]
+        if self._prev is not None:
+            change = close - self._prev
+            self._gain.update(max(change, 0.0))
+            self._loss.update(max(-change, 0.0))
+        self._prev = close
+
+    def clone(self) -> "_Rsi":
+        c = copy.copy(self)
+        c._gain, c._loss = copy.copy(self._gain), copy.copy(self._loss)
+        return c
+
+    @property
+    def value(self) -> float | None:
+        if not self._gain.ready:
+            return None
+        gain, loss = self._gain.avg, self._loss.avg
+        if loss == 0:
+            return 100.0 if gain > 0 else 50.0
+        return 100 - 100 / (1 + gain / loss)
+
+
+class _Atr:
+    __slots__ = ("n", "_prev", "_tr")
+
+    def __init__(self, n: int):
+        self.n = n
+        self._prev: float | None = None
+        self._tr = _Wilder(n)
+
+    def update(self, bar: dict):
+        high, low = bar["high"], bar["low"]
+        tr = high - low
+        if self._prev is not None:
+            tr = max(tr, abs(high - self._prev), abs(low - self._prev))
+        self._tr.update(tr)
+        self._prev = bar["close"]
+
+    def clone(self) -> "_Atr":
+        c = copy.copy(self)
+        c._tr = copy.copy(self._tr)
+        return c
+
+    @property
+    def value(self) -> float | None:
+        return self._tr.avg if self._tr.ready else None
+
+
+class _Vwap:
+    __slots__ = ("_day", "_pv", "_volume")
+
+    def __init__(self):
+        self._day = None
+        self._pv = 0.0
+        self._volume = 0
+
+    def update(self, bar: dict):
+        day = datetime.fromtimestamp(bar["timestamp"] / 1000).date()
+        if day != self._day:
+            self._day, self._pv, self._volume = day, 0.0, 0
+        volume = bar["volume"]
+        # 个别市场/品种 turnover 为 0 时退回典型价
+        turnover = bar["turnover"] or (bar["high"] + bar["low"] + bar["close"]) / 3 * volume
+        self._pv += turnover
+        self._volume += volume
+
+    def clone(self) -> "_Vwap":
+        return copy.copy(self)
+
+    @property
+    def value(self) -> float | None:
+        return self._pv / self._volume if self._volume else None
+
+
+def _parse_periods(value: str) -> list[int]:
+    return [int(p) for p in value.split(",") if p.strip()]
+
+
+class _State:
+    __slots__ = ("indicators", "pending", "bars", "seeded_at", "expires_at", "late")
+
+    def __init__(self, spec: list[tuple[str, type, tuple]]):
+        self.indicators = {name: cls(*args) for name, cls, args in spec}
+        # 在途（尚未提交）的最后一根
+        self.pending: dict | None = None
+        self.bars = 0
+        self.seeded_at: float | None = None
+        # 无推送订阅时预热结果的有效期（下一根 K 线收线），过后需重新预热
+        self.expires_at: float | None = None
+        self.late = 0
+
+    def feed(self, bar: dict):
+        pending = self.pending
+        if pending is not None:
+            if bar["timestamp"] < pending["timestamp"]:
+                # 已提交区间内的修正无法 O(1) 回滚，忽略
+                self.late += 1
+                return
+            if bar["timestamp"] > pending["timestamp"]:
+                for ind in self.indicators.values():
+                    ind.update(pending)
+                self.bars += 1
+        self.pending = bar
+
+    def snapshot(self) -> tuple[dict | None, int, dict]:
+        """持锁时调用：复制出读取所需的全部状态"""
+        return self.pending, self.bars, {name: ind.clone() for name, ind in self.indicators.items()}
+
+
+def _evaluate(snapshot: tuple[dict | None, int, dict]) -> dict:
+    """在状态副本上叠加在途 K 线，得到当前指标值（不持锁）"""
+    pending, bars, live = snapshot
+    if pending is None:
+        return {"timestamp": None, "close": None, "bars": 0, **{name: None for name in live}}
+    out = {"timestamp": pending["timestamp"], "close": pending["close"], "bars": bars + 1}
+    for name, ind in live.items():
+        ind.update(pending)
+        out[name] = ind.value
+    return out
+
+
+class IndicatorEngine:
+    def __init__(self, ema: list[int], rsi: list[int], atr: list[int], warmup_bars: int):
+        self.spec: list[tuple[str, type, tuple]] = (
+            [(f"ema_{n}", _Ema, (n,)) for n in ema]
+            + [(f"rsi_{n}", _Rsi, (n,)) for n in rsi]
+            + [(f"atr_{n}", _Atr, (n,)) for n in atr]
+            + [("vwap", _Vwap, ())]
+        )
+        self.warmup_bars = warmup_bars
+        self._states: dict[tuple[str, str], _State] = {}
+        # 推送线程递推与事件循环预热/读取之间互斥，持锁期间只做 O(1) 的递推或复制
+        self._lock = threading.Lock()
+        self.bars_in = 0
+        self.seeds = 0
+
+    @classmethod
+    def from_env(cls) -> "IndicatorEngine":
+        """
+        INDICATOR_EMA / INDICATOR_RSI / INDICATOR_ATR: 逗号分隔的周期，如 INDICATOR_EMA=9,21
+        INDICATOR_WARMUP_BARS: 首次查询时用于预热的历史 K 线根数
+        """
+        return cls(
+            ema=_parse_periods(os.getenv("INDICATOR_EMA", "9,21")),
+            rsi=_parse_periods(os.getenv("INDICATOR_RSI", "14")),
+            atr=_parse_periods(os.getenv("INDICATOR_ATR", "14")),
+            warmup_bars=int(os.getenv("INDICATOR_WARMUP_BARS", "300")),
+        )
+
+    @property
+    def names(self) -> list[str]:
+        return [name for name, _, _ in self.spec]
+
+    def on_bars(self, ktype: str, bars: list[tuple[str, dict]]):
+        """推送写入的 (code, bar)，在 FutuOpenD 回调线程上调用"""
+        if not bars:
+            return
+        with self._lock:
+            for code, bar in bars:
+                state = self._states.get((code, ktype))
+                if state is None:
+                    state = self._states[(code, ktype)] = _State(self.spec)
+                state.feed(bar)
+            self.bars_in += len(bars)
+
+    def needs_seed(self, code: str, ktype: str, subscribed_at: float | None) -> bool:
+        """
+        未预热过，或预热后订阅重建过（推送中间可能断档），
+        或没有推送订阅（指标不会随推送更新）且预热结果已过一根 K 线
+        """
+        state = self._states.get((code, ktype))
+        if state is None or state.seeded_at is None:
+            return True
+        if subscribed_at is None:
+            return state.expires_at is None or time.time() >= state.expires_at
+        return state.seeded_at < subscribed_at
+
+    def seed(self, code: str, ktype: str, history: list[dict], recent, expires_at: float | None = None):
+        """
+        用历史 K 线重建状态。recent(since) 返回推送缓冲中 timestamp >= since 的 K 线，
+        补上拉取历史期间到达的推送：历史在锁外回放，推送缓冲部分在锁内回放后替换，之后的推送直接接续。
+        expires_at 为没有推送订阅时这次预热的有效期
+        """
+        state = _State(self.spec)
+        for bar in history:
+            state.feed(bar)
+        since = history[-1]["timestamp"] if history else 0
+        with self._lock:
+            for bar in recent(since):
+                state.feed(bar)
+            state.seeded_at = time.time()
+            state.expires_at = expires_at
+            self._states[(code, ktype)] = state
+            self.seeds += 1
+
+    def values(self, code: str, ktype: str) -> dict | None:
+        with self._lock:
+            state = self._states.get((code, ktype))
+            if state is None:
+                return None
+            snapshot = state.snapshot()
+        return _evaluate(snapshot)
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = list(self._states.values())
+        return {
+            "series": len(states),
+            "indicators": self.names,
+            "bars_in": self.bars_in,
+            "seeds": self.seeds,
+            "late": sum(s.late for s in states),
+        }
@@ -0,0 +1,133 @@
+"""
+/kline 历史 K 线进程内缓存
+按 (symbol, ktype) 缓存已格式化的 K 线，TTL 按周期区分：
+- 日/周 K：固定长 TTL（盘中只有最后一根在变）
+- 分钟 K：到下一根 K 线边界即过期
+容量按估算字节数做 LRU 淘汰。仅在事件循环线程内访问，无需加锁。
+"""
+
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+
+# 分钟级 K 线周期（秒）
+MINUTE_KTYPE_SECONDS = {
+    "K_1M": 60,
+    "K_3M": 180,
+    "K_5M": 300,
+    "K_15M": 900,
+    "K_30M": 1800,
+    "K_60M": 3600,
+}
+
+_SAMPLE_BAR = {
+    "timestamp": 1700000000000, "open": 1.0, "high": 1.0, "low": 1.0,
+    "close": 1.0, "volume": 1, "turnover": 1.0,
+}
+# 单根 K 线 dict 的近似内存占用（dict + 7 个数值对象）
+BAR_BYTES_EST = sys.getsizeof(_SAMPLE_BAR) + sum(sys.getsizeof(v) for v in _SAMPLE_BAR.values())
+
+
+class _Entry:
+    __slots__ = ("bars", "fetched_count", "expires_at", "size")
+
+    def __init__(self, bars: list[dict], fetched_count: int, expires_at: float):
+        self.bars = bars
+        self.fetched_count = fetched_count
+        self.expires_at = expires_at
+        self.size = len(bars) * BAR_BYTES_EST
+
+
+class KlineCache:
+    def __init__(self, max_bytes: int, ttl_day: float, ttl_week: float, bar_grace: float):
+        self.max_bytes = max_bytes
+        self.ttl_day = ttl_day
+        self.ttl_week = ttl_week
+        self.bar_grace = bar_grace
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "KlineCache":
+        """
+        KLINE_CACHE_MAX_MB: 缓存内存上限（估算值）
+        KLINE_CACHE_TTL_DAY / KLINE_CACHE_TTL_WEEK: 日/周 K TTL（秒）
+        KLINE_CACHE_BAR_GRACE: 分钟 K 边界后额外保留秒数，等待 FutuOpenD 落盘
+        """
+        return cls(
+            max_bytes=int(float(os.getenv("KLINE_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            ttl_day=float(os.getenv("KLINE_CACHE_TTL_DAY", "600")),
+            ttl_week=float(os.getenv("KLINE_CACHE_TTL_WEEK", "1800")),
+            bar_grace=float(os.getenv("KLINE_CACHE_BAR_GRACE", "2")),
+        )
+
+    def expires_at(self, ktype: str, now: float) -> float:
+        if ktype == "K_DAY":
+            return now + self.ttl_day
+        if ktype == "K_WEEK":
+            return now + self.ttl_week
+        secs = MINUTE_KTYPE_SECONDS.get(ktype, 60)
+        # 美股 60 分钟 K 在 :30 收线，按半小时对齐保证收线后必然刷新
+        align = min(secs, 1800)
+        return math.floor(now / align + 1) * align + self.bar_grace
+
+    def get(self, symbol: str, ktype: str, count: int) -> list[dict] | None:
+        """命中返回最后 count 根；请求数量超过缓存拉取量视为 miss"""
+        key = (symbol, ktype)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.time():
+            self._remove(key)
+            self.expired += 1
+            self.misses += 1
+            return None
+        if count > entry.fetched_count:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        bars = entry.bars
+        return bars[-count:] if len(bars) > count else bars
+
+    def put(self, symbol: str, ktype: str, count: int, bars: list[dict]):
+        key = (symbol, ktype)
+        if key in self._entries:
+            self._remove(key)
+        entry = _Entry(bars, count, self.expires_at(ktype, time.time()))
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and self._entries:
+            old_key = next(iter(self._entries))
+            self._remove(old_key)
+            self.evictions += 1
+
+    def _remove(self, key: tuple[str, str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes_est": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,239 @@
+"""
+K 线本地持久化（SQLite）
+- kline_<ktype>：KlineStore 各序列的镜像，每个 ktype 一张表，主键 (symbol, timestamp)；
+  series_meta 记录每个序列上次整段拉取时间与可覆盖深度。重启后从磁盘恢复序列，只向 FutuOpenD 拉缺失的尾部
+- realtime_k_1m：实时 1min 推送缓冲的镜像，定时增量刷盘，启动时回填实时缓冲
+- trading_calendar：按 (market, 年份) 整年保存的交易日历
+所有读写在单线程执行器上串行执行，不占用 FutuOpenD 调用线程池，也不阻塞事件循环；
+写入不等待完成（失败只记日志），读取在请求路径上等待。
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from kline_format import KLINE_FIELDS
+
+log = logging.getLogger("futu-bridge")
+
+_COLUMNS = ", ".join(KLINE_FIELDS)
+_PLACEHOLDERS = ", ".join("?" for _ in ("symbol", *KLINE_FIELDS))
+REALTIME_TABLE = "realtime_k_1m"
+
+
+def _table(ktype: str) -> str:
+    # ktype 来自 KTYPE_MAP 白名单，只含字母数字下划线
+    if not ktype.replace("_", "").isalnum():
+        raise ValueError(f"非法 ktype: {ktype}")
+    return f"kline_{ktype.lower()}"
+
+
+def _rows_to_bars(rows: list[tuple]) -> list[dict]:
+    return [dict(zip(KLINE_FIELDS, row)) for row in rows]
+
+
+class KlineDisk:
+    def __init__(self, path: str):
+        self.path = path
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kline-disk")
+        self._conn: sqlite3.Connection | None = None
+        self._tables: set[str] = set()
+        self.reads = 0
+        self.bars_read = 0
+        self.writes = 0
+        self.bars_written = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "KlineDisk | None":
+        """KLINE_DISK_PATH: SQLite 文件路径，留空关闭持久化"""
+        path = os.getenv("KLINE_DISK_PATH", "data/klines.sqlite3")
+        return cls(path) if path else None
+
+    # ---------- 执行器线程内 ----------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS series_meta ("
+                "symbol TEXT, ktype TEXT, last_full REAL, depth INTEGER, PRIMARY KEY (symbol, ktype))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trading_calendar ("
+                "market TEXT, year INTEGER, day TEXT, type TEXT, fetched_at REAL, PRIMARY KEY (market, year, day))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _ensure(self, table: str):
+        if table not in self._tables:
+            self._db().execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "symbol TEXT NOT NULL, timestamp INTEGER NOT NULL, open REAL, high REAL, low REAL, close REAL, "
+                "volume INTEGER, turnover REAL, PRIMARY KEY (symbol, timestamp)) WITHOUT ROWID"
+            )
+            self._tables.add(table)
+
+    def _select_tail(self, table: str, symbol: str, limit: int) -> list[dict]:
+        self._ensure(table)
+        rows = self._db().execute(
+            f"SELECT {_COLUMNS} FROM {table} WHERE symbol = ? ORDER BY timestamp DESC LIMIT ?", (symbol, limit)
+        ).fetchall()
+        rows.reverse()
+        return _rows_to_bars(rows)
+
+    def _upsert(self, table: str, symbol: str, bars: list[dict], keep: int | None):
+        self._ensure(table)
+        db = self._db()
+        with db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO {table} (symbol, {_COLUMNS}) VALUES ({_PLACEHOLDERS})",
+                [(symbol, *(b[f] for f in KLINE_FIELDS)) for b in bars],
+            )
+            if keep is not None:
+                # 只保留最近 keep 根
+                db.execute(
+                    f"DELETE FROM {table} WHERE symbol = ? AND timestamp < ("
+                    f"SELECT timestamp FROM {table} WHERE symbol = ? ORDER BY timestamp DESC LIMIT 1 OFFSET ?)",
+                    (symbol, symbol, keep - 1),
+                )
+
+    def _load_series(self, symbol: str, ktype: str, limit: int) -> tuple[list[dict], float, int]:
+        meta = self._db().execute(
+            "SELECT last_full, depth FROM series_meta WHERE symbol = ? AND ktype = ?", (symbol, ktype)
+        ).fetchone()
+        if meta is None:
+            return [], 0.0, 0
+        return self._select_tail(_table(ktype), symbol, limit), meta[0], meta[1]
+
+    def _save_series(self, symbol: str, ktype: str, bars: list[dict], full: bool, last_full: float, depth: int,
+                     keep: int):
+        table = _table(ktype)
+        self._ensure(table)
+        db = self._db()
+        with db:
+            if full:
+                # 整段重拉（复权价可能整体变化）：先清掉旧数据
+                db.execute(f"DELETE FROM {table} WHERE symbol = ?", (symbol,))
+            else:
+                # 与 KlineStore._merge 一致：丢弃 >= 尾部首根时间的旧 K 线
+                db.execute(f"DELETE FROM {table} WHERE symbol = ? AND timestamp >= ?", (symbol, bars[0]["timestamp"]))
+        self._upsert(table, symbol, bars, keep)
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO series_meta (symbol, ktype, last_full, depth) VALUES (?, ?, ?, ?)",
+                (symbol, ktype, last_full, depth),
+            )
+
+    def _realtime_symbols(self) -> list[str]:
+        self._ensure(REALTIME_TABLE)
+        return [r[0] for r in self._db().execute(f"SELECT DISTINCT symbol FROM {REALTIME_TABLE}")]
+
+    def _load_calendar(self, market: str) -> dict[int, tuple[list[tuple[str, str]], float]]:
+        years: dict[int, tuple[list[tuple[str, str]], float]] = {}
+        rows = self._db().execute(
+            "SELECT year, day, type, fetched_at FROM trading_calendar WHERE market = ? ORDER BY day", (market,)
+        )
+        for year, day, day_type, fetched_at in rows:
+            days, _ = years.setdefault(year, ([], fetched_at))
+            if day:
+                days.append((day, day_type))
+        return years
+
+    def _save_calendar(self, market: str, year: int, days: list[tuple[str, str]], fetched_at: float):
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM trading_calendar WHERE market = ? AND year = ?", (market, year))
+            db.executemany(
+                "INSERT INTO trading_calendar (market, year, day, type, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                [(market, year, d, t, fetched_at) for d, t in days],
+            )
+
+    # ---------- 事件循环侧 ----------
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def _submit(self, fn, *args):
+        """后台写入，不等待完成"""
+        def _done(fut):
+            if fut.exception() is not None:
+                self.errors += 1
+                log.warning(f"K 线落盘失败: {fut.exception()}")
+        self._pool.submit(fn, *args).add_done_callback(_done)
+
+    async def load_series(self, symbol: str, ktype: str, limit: int) -> tuple[list[dict], float, int]:
+        """KlineStore 序列：(最后 limit 根, 上次整段拉取时间, 可覆盖深度)；磁盘上没有时返回 ([], 0, 0)"""
+        try:
+            bars, last_full, depth = await self._run(self._load_series, symbol, ktype, limit)
+        except Exception as e:
+            self.errors += 1
+            log.warning(f"读取本地 K 线失败: {symbol} {ktype}: {e}")
+            return [], 0.0, 0
+        self.reads += 1
+        self.bars_read += len(bars)
+        return bars, last_full, depth
+
+    def save_series(self, symbol: str, ktype: str, bars: list[dict], full: bool, last_full: float, depth: int,
+                    keep: int):
+        """整段（full=True，替换全部）或尾部（替换尾部首根之后）落盘，只保留最近 keep 根"""
+        if not bars:
+            return
+        self.writes += 1
+        self.bars_written += len(bars)
+        self._submit(self._save_series, symbol, ktype, list(bars), full, last_full, depth, keep)
+
+    def save_realtime(self, symbol: str, bars: list[dict], keep: int):
+        if not bars:
+            return
+        self.writes += 1
+        self.bars_written += len(bars)
+        self._submit(self._upsert, REALTIME_TABLE, symbol, bars, keep)
+
+    async def load_realtime(self, limit: int) -> dict[str, list[dict]]:
+        """所有标的最近 limit 根实时 1min K 线，用于启动时回填"""
+        def _load():
+            return {s: self._select_tail(REALTIME_TABLE, s, limit) for s in self._realtime_symbols()}
+        result = await self._run(_load)
+        self.reads += 1
+        self.bars_read += sum(len(b) for b in result.values())
+        return result
+
+    async def load_calendar(self, market: str) -> dict[int, tuple[list[tuple[str, str]], float]]:
+        """年份 → (交易日 [(date, type)], 拉取时间)"""
+        try:
+            years = await self._run(self._load_calendar, market)
+        except Exception as e:
+            self.errors += 1
+            log.warning(f"读取本地交易日历失败: {market}: {e}")
+            return {}
+        self.reads += 1
+        return years
+
+    def save_calendar(self, market: str, year: int, days: list[tuple[str, str]], fetched_at: float):
+        self.writes += 1
+        self._submit(self._save_calendar, market, year, days, fetched_at)
+
+    def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._pool.submit(_close)
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "reads": self.reads,
+            "bars_read": self.bars_read,
+            "writes": self.writes,
+            "bars_written": self.bars_written,
+            "errors": self.errors,
+        }
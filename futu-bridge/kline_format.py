@@ -0,0 +1,76 @@
+"""
+K 线 DataFrame → 标准 JSON 的列式转换
+time_key 整列一次解析为毫秒时间戳，OHLCV 整列用 NumPy 转型，
+输出与逐行 strptime + float()/int() 的旧实现逐字节一致。
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+KLINE_FIELDS = ("timestamp", "open", "high", "low", "close", "volume", "turnover")
+FLOAT_FIELDS = ("open", "high", "low", "close", "turnover")
+
+_NS_PER_HOUR = 3600 * 10**9
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _local_is_utc() -> bool:
+    return time.timezone == 0 and time.altzone == 0
+
+
+def _naive_to_epoch_ms(dt: pd.Series) -> np.ndarray:
+    """
+    naive 本地时间 → 毫秒时间戳，语义与 datetime.timestamp() 相同。
+    非 UTC 时区按整点取偏移（DST 切换都发生在整点），每个不同的小时只调一次 timestamp()。
+    """
+    valid = dt.notna().to_numpy()
+    ns = dt.to_numpy(dtype="datetime64[ns]").view("int64")
+    if _local_is_utc():
+        ms = ns // 10**6
+    else:
+        hours = ns[valid] // _NS_PER_HOUR
+        offsets = np.zeros(len(ns), dtype="int64")
+        if len(hours):
+            uniq, inv = np.unique(hours, return_inverse=True)
+            off = np.array([h * 3600 - int((_EPOCH + timedelta(hours=int(h))).timestamp()) for h in uniq], dtype="int64")
+            offsets[valid] = off[inv] * 1000
+        ms = ns // 10**6 - offsets
+    return np.where(valid, ms, 0)
+
+
+def time_key_to_ms(time_key: pd.Series) -> np.ndarray:
+    """time_key 列 → 毫秒时间戳，先按 '%Y-%m-%d %H:%M:%S' 再按 '%Y-%m-%d' 解析，失败为 0"""
+    if pd.api.types.infer_dtype(time_key, skipna=True) != "string":
+        # 与旧实现一致：非字符串值一律视为 0
+        time_key = time_key.where(time_key.map(lambda v: isinstance(v, str)))
+    dt = pd.to_datetime(time_key, format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    missing = dt.isna() & time_key.notna()
+    if missing.any():
+        dt = dt.where(~missing, pd.to_datetime(time_key.where(missing), format="%Y-%m-%d", errors="coerce"))
+    return _naive_to_epoch_ms(dt)
+
+
+def frame_to_columns(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """FutuOpenD K 线 DataFrame → 各字段一维数组（timestamp/volume 为 int64，其余 float64）"""
+    n = len(df)
+    cols: dict[str, np.ndarray] = {}
+    if "time_key" in df.columns:
+        cols["timestamp"] = time_key_to_ms(df["time_key"])
+    else:
+        cols["timestamp"] = np.zeros(n, dtype="int64")
+    for f in FLOAT_FIELDS:
+        cols[f] = df[f].to_numpy(dtype="float64") if f in df.columns else np.zeros(n, dtype="float64")
+    cols["volume"] = df["volume"].to_numpy().astype("int64") if "volume" in df.columns else np.zeros(n, dtype="int64")
+    return {f: cols[f] for f in KLINE_FIELDS}
+
+
+def columns_to_klines(cols: dict[str, np.ndarray]) -> list[dict]:
+    """列数组 → 每根 K 线一个 dict（值为 Python int/float）"""
+    return [dict(zip(KLINE_FIELDS, vals)) for vals in zip(*(cols[f].tolist() for f in KLINE_FIELDS))]
+
+
+def frame_to_klines(df: pd.DataFrame) -> list[dict]:
+    return columns_to_klines(frame_to_columns(df))
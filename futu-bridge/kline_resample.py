@@ -0,0 +1,246 @@
+"""
+由 1min 推送增量合成 5/15/30/60 分钟 K 线
+每收到一根新增或更新的 1min K 线（time_key 为收线时间），按所属交易时段对齐到派生周期：
+已收线的 1min 部分累计成一个聚合值，在途的最后一根单独保存，更新时 O(1) 合并后原地覆盖派生 K 线。
+60 分钟 K 按时段起点对齐（美股 10:30 … 15:30、16:00），其余周期与自然时间对齐一致。
+订阅建立后看到的第一根派生 K 线缺少开头的分钟，不写入；乱序到达的 1min 从实时缓冲重算所在区间。
+"""
+
+import functools
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from realtime_buffer import RealtimeKlines
+from ring_buffer import KlineRing, view_to_klines
+
+# 派生周期 → 分钟数
+DERIVED_KTYPES = {"K_5M": 5, "K_15M": 15, "K_30M": 30, "K_60M": 60}
+
+# 各市场连续交易时段（当地时间，距零点分钟数，左开右闭，与 1min K 收线时间对应）
+SESSIONS = {
+    "US": ((570, 960),),
+    "HK": ((570, 720), (780, 960)),
+    "SH": ((570, 690), (780, 900)),
+    "SZ": ((570, 690), (780, 900)),
+}
+
+
+@functools.lru_cache(maxsize=16384)
+def bucket_bounds(market: str, ts: int, minutes: int) -> tuple[int, int]:
+    """收线时间为 ts 的 1min K 线所属派生 K 线的 (起点, 收线时间)，毫秒；所有标的同一分钟共用缓存"""
+    dt = datetime.fromtimestamp(ts / 1000)
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    m = dt.hour * 60 + dt.minute
+    if m == 0:
+        # 00:00 收线的 K 线属于前一天最后一分钟
+        day -= timedelta(days=1)
+        m = 1440
+    # 盘前盘后等不在交易时段内的 K 线按自然时间对齐
+    start, end = 0, 1440
+    for s, e in SESSIONS.get(market, ()):
+        if s < m <= e:
+            start, end = s, e
+            break
+    b_start = start + (m - start - 1) // minutes * minutes
+    b_end = min(b_start + minutes, end)
+    return (
+        int((day + timedelta(minutes=b_start)).timestamp() * 1000),
+        int((day + timedelta(minutes=b_end)).timestamp() * 1000),
+    )
+
+
+def _merge(a: dict | None, b: dict) -> dict:
+    if a is None:
+        return b
+    return {
+        "timestamp": b["timestamp"],
+        "open": a["open"],
+        "high": max(a["high"], b["high"]),
+        "low": min(a["low"], b["low"]),
+        "close": b["close"],
+        "volume": a["volume"] + b["volume"],
+        "turnover": a["turnover"] + b["turnover"],
+    }
+
+
+def _aggregate(view: np.ndarray, end: int) -> dict:
+    return {
+        "timestamp": end,
+        "open": float(view["open"][0]),
+        "high": float(view["high"].max()),
+        "low": float(view["low"].min()),
+        "close": float(view["close"][-1]),
+        "volume": int(view["volume"].sum()),
+        "turnover": float(view["turnover"].sum()),
+    }
+
+
+class _Bucket:
+    """一根在途派生 K 线的增量状态"""
+    __slots__ = ("start", "end", "closed", "cur", "partial")
+
+    def __init__(self, start: int, end: int, partial: bool):
+        self.start = start
+        self.end = end
+        # 已收线的 1min 聚合值
+        self.closed: dict | None = None
+        # 在途的最后一根 1min
+        self.cur: dict | None = None
+        self.partial = partial
+
+    def bar(self) -> dict:
+        return {**_merge(self.closed, self.cur), "timestamp": self.end}
+
+
+class _Series:
+    __slots__ = ("created", "rings", "buckets")
+
+    def __init__(self, capacity: int):
+        self.created = time.time()
+        self.rings = {ktype: KlineRing(capacity) for ktype in DERIVED_KTYPES}
+        self.buckets: dict[str, _Bucket] = {}
+
+
+class DerivedKlines:
+    def __init__(self, source: RealtimeKlines, capacity: int):
+        """source 为 1min 实时缓冲，乱序推送时从中重算区间"""
+        self.source = source
+        self.capacity = capacity
+        self._series: dict[str, _Series] = {}
+        # 写入方（FutuOpenD 回调线程）与重置之间互斥；读取走 KlineRing 版本号，不加锁
+        self._lock = threading.Lock()
+        self.bars_in = 0
+        self.recomputes = 0
+        self.resets = 0
+        self.served = 0
+        self.spliced = 0
+
+    @classmethod
+    def from_env(cls, source: RealtimeKlines) -> "DerivedKlines":
+        """DERIVED_KLINE_MAX: 每个标的每个派生周期保留的 K 线根数"""
+        return cls(source, capacity=int(os.getenv("DERIVED_KLINE_MAX", "300")))
+
+    def on_bars(self, bars: list[tuple[str, dict]]) -> dict[str, list[tuple[str, dict]]]:
+        """
+        RealtimeKlines.ingest 返回的 (code, 1min bar)，在 FutuOpenD 回调线程上调用。
+        返回各周期本次写入的在途派生 K 线 ktype → [(code, bar)]（乱序重算的历史区间不含在内）
+        """
+        written: dict[str, list[tuple[str, dict]]] = {}
+        if not bars:
+            return written
+        with self._lock:
+            for code, bar in bars:
+                series = self._series.get(code)
+                if series is None:
+                    series = self._series[code] = _Series(self.capacity)
+                market = code.split(".", 1)[0]
+                for ktype, minutes in DERIVED_KTYPES.items():
+                    derived = self._update(code, series, ktype, market, minutes, bar)
+                    if derived is not None:
+                        written.setdefault(ktype, []).append((code, derived))
+            self.bars_in += len(bars)
+        return written
+
+    def _update(self, code: str, series: _Series, ktype: str, market: str, minutes: int, bar: dict) -> dict | None:
+        ts = bar["timestamp"]
+        start, end = bucket_bounds(market, ts, minutes)
+        bucket = series.buckets.get(ktype)
+        if bucket is None or end > bucket.end:
+            # 订阅后第一根派生 K 线若不是从区间第一分钟开始，则数据不完整
+            bucket = series.buckets[ktype] = _Bucket(start, end, partial=bucket is None and ts != start + 60_000)
+            bucket.cur = bar
+        elif end == bucket.end and ts >= bucket.cur["timestamp"]:
+            if ts > bucket.cur["timestamp"]:
+                bucket.closed = _merge(bucket.closed, bucket.cur)
+            bucket.cur = bar
+        else:
+            self._recompute(code, series, ktype, start, end, bucket if end == bucket.end else None)
+            return None
+        if bucket.partial:
+            return None
+        derived = bucket.bar()
+        series.rings[ktype].upsert(derived)
+        return derived
+
+    def _recompute(self, code: str, series: _Series, ktype: str, start: int, end: int, bucket: _Bucket | None):
+        """乱序的 1min K 线：从实时缓冲取整个区间重新聚合"""
+        self.recomputes += 1
+        view = self.source.snapshot(code, since=start + 1)
+        view = view[:int(np.searchsorted(view["timestamp"], end, side="right"))]
+        if not len(view):
+            return
+        complete = int(view["timestamp"][0]) == start + 60_000
+        if bucket is not None:
+            bucket.closed = _aggregate(view[:-1], end) if len(view) > 1 else None
+            bucket.cur = view_to_klines(view[-1:])[0]
+            # 迟到的可能正是区间第一分钟
+            bucket.partial = bucket.partial and not complete
+            if bucket.partial:
+                return
+        elif not complete:
+            # 缓冲里已没有该区间开头的分钟，无法保证完整
+            return
+        series.rings[ktype].upsert(_aggregate(view, end))
+
+    def read(self, code: str, ktype: str, subscribed_at: float | None) -> list[dict] | None:
+        """
+        派生 K 线（含在途的最后一根）；ktype 不支持派生或 1min 订阅不在时返回 None。
+        subscribed_at 为 1min 订阅建立时间，早于它生成的序列可能有断档，丢弃重建。
+        """
+        if ktype not in DERIVED_KTYPES or subscribed_at is None:
+            return None
+        series = self._series.get(code)
+        if series is None:
+            return None
+        if series.created < subscribed_at:
+            with self._lock:
+                if self._series.get(code) is series:
+                    del self._series[code]
+                    self.resets += 1
+            return None
+        ring = series.rings[ktype]
+        view = ring.snapshot()
+        if view is None:
+            with self._lock:
+                view = ring.window().copy()
+        return view_to_klines(view)
+
+    def serve(self, code: str, ktype: str, count: int, subscribed_at: float | None,
+              history: list[dict]) -> list[dict] | None:
+        """
+        最后 count 根派生 K 线；不足 count 时与本地已有的历史 K 线拼接，
+        历史需覆盖到派生序列的第一根，否则返回 None 由调用方向 FutuOpenD 拉取。
+        """
+        bars = self.read(code, ktype, subscribed_at)
+        if not bars:
+            return None
+        if len(bars) < count:
+            first_ts = bars[0]["timestamp"]
+            if not history or history[-1]["timestamp"] < first_ts:
+                return None
+            cut = len(history)
+            while cut > 0 and history[cut - 1]["timestamp"] >= first_ts:
+                cut -= 1
+            bars = history[:cut] + bars
+            if len(bars) < count:
+                return None
+            self.spliced += 1
+        self.served += 1
+        return bars[-count:]
+
+    def stats(self) -> dict:
+        series = dict(self._series)
+        return {
+            "symbols": len(series),
+            "capacity": self.capacity,
+            "depth": {ktype: sum(len(s.rings[ktype]) for s in series.values()) for ktype in DERIVED_KTYPES},
+            "bars_in": self.bars_in,
+            "recomputes": self.recomputes,
+            "resets": self.resets,
+            "served": self.served,
+            "spliced": self.spliced,
+        }
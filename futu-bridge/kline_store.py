@@ -0,0 +1,129 @@
+"""
+增量 K 线历史存储
+每个 (symbol, ktype) 保留一段已格式化的 K 线，记住最后一根的时间。
+后续请求只向 FutuOpenD 拉取最后一根所在日期之后的尾部，覆盖写入后从本地返回。
+前复权价格会因除权整体变化，超过 full_refresh 秒强制整段重拉一次。
+配置了 KlineDisk 时每次拉取后落盘；进程重启后序列首次访问先从磁盘恢复，只拉尾部。
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+
+
+class _Series:
+    __slots__ = ("bars", "depth", "last_full", "lock", "loaded")
+
+    def __init__(self):
+        self.bars: list[dict] = []
+        # 本地可直接覆盖的 count 上限，超过则整段重拉
+        self.depth = 0
+        self.last_full = 0.0
+        self.lock = asyncio.Lock()
+        # 是否已尝试从磁盘恢复
+        self.loaded = False
+
+
+class KlineStore:
+    def __init__(self, max_bars: int, full_refresh: float, disk=None):
+        self.max_bars = max_bars
+        self.full_refresh = full_refresh
+        self.disk = disk
+        self._series: dict[tuple[str, str], _Series] = {}
+        self.full_fetches = 0
+        self.tail_fetches = 0
+        self.bars_fetched = 0
+        self.disk_loads = 0
+
+    @classmethod
+    def from_env(cls, disk=None) -> "KlineStore":
+        """
+        KLINE_STORE_MAX_BARS: 每个 (symbol, ktype) 最多保留的 K 线数
+        KLINE_STORE_FULL_REFRESH: 强制整段重拉间隔（秒），用于同步复权调整
+        """
+        return cls(
+            max_bars=int(os.getenv("KLINE_STORE_MAX_BARS", "2000")),
+            full_refresh=float(os.getenv("KLINE_STORE_FULL_REFRESH", "21600")),
+            disk=disk,
+        )
+
+    async def read(self, symbol: str, ktype: str, count: int, window_start, fetch) -> list[dict]:
+        """
+        返回最后 count 根 K 线。
+        fetch(start_date) 为协程，返回从 start_date 起的已格式化 K 线（按时间升序）；
+        window_start(count) 返回覆盖 count 根 K 线所需的整段拉取起始日期。
+        """
+        key = (symbol, ktype)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+
+        async with series.lock:
+            if not series.loaded:
+                series.loaded = True
+                if self.disk is not None:
+                    await self._restore(symbol, ktype, series)
+            now = time.time()
+            need_full = (
+                not series.bars
+                or count > series.depth
+                or now - series.last_full > self.full_refresh
+            )
+            if need_full:
+                depth = max(count, series.depth)
+                bars = await fetch(window_start(depth))
+                self.full_fetches += 1
+                self.bars_fetched += len(bars)
+                series.bars = bars[-self.max_bars:]
+                # 整段窗口通常比 count 宽，本地实际根数也算可覆盖深度
+                series.depth = max(depth, len(series.bars)) if series.bars else 0
+                series.last_full = now
+                if self.disk is not None:
+                    self.disk.save_series(symbol, ktype, series.bars, True, now, series.depth, self.max_bars)
+            else:
+                last_ts = series.bars[-1]["timestamp"]
+                tail = await fetch(datetime.fromtimestamp(last_ts / 1000).strftime("%Y-%m-%d"))
+                self.tail_fetches += 1
+                self.bars_fetched += len(tail)
+                self._merge(series, tail)
+                if self.disk is not None:
+                    self.disk.save_series(symbol, ktype, tail, False, series.last_full, series.depth, self.max_bars)
+
+            bars = series.bars
+            return bars[-count:] if len(bars) > count else list(bars)
+
+    async def _restore(self, symbol: str, ktype: str, series: _Series):
+        bars, last_full, depth = await self.disk.load_series(symbol, ktype, self.max_bars)
+        if bars:
+            series.bars, series.last_full, series.depth = bars, last_full, depth
+            self.disk_loads += 1
+
+    def peek(self, symbol: str, ktype: str) -> list[dict]:
+        """本地已有的 K 线，不拉取；未加载过时为空"""
+        series = self._series.get((symbol, ktype))
+        return series.bars if series is not None else []
+
+    def _merge(self, series: _Series, tail: list[dict]):
+        """尾部覆盖写入：丢弃本地 >= 尾部首根时间的 K 线（含未收线的最后一根）再追加"""
+        if not tail:
+            return
+        first_ts = tail[0]["timestamp"]
+        bars = series.bars
+        cut = len(bars)
+        while cut > 0 and bars[cut - 1]["timestamp"] >= first_ts:
+            cut -= 1
+        merged = bars[:cut] + tail
+        if len(merged) > self.max_bars:
+            merged = merged[-self.max_bars:]
+        series.bars = merged
+
+    def stats(self) -> dict:
+        return {
+            "series": len(self._series),
+            "bars": sum(len(s.bars) for s in self._series.values()),
+            "full_fetches": self.full_fetches,
+            "tail_fetches": self.tail_fetches,
+            "bars_fetched": self.bars_fetched,
+            "disk_loads": self.disk_loads,
+        }
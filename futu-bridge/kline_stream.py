@@ -0,0 +1,77 @@
+"""
+实时 K 线推送广播
+FutuOpenD 回调线程收到 K 线后经 call_soon_threadsafe 投递到事件循环，
+再分发给订阅了该标的的 SSE / WebSocket 连接。
+同一根 K 线在收线前会多次推送（timestamp 相同），客户端按 timestamp 覆盖即可。
+"""
+
+import asyncio
+import os
+
+
+class Subscriber:
+    """单个流式连接的有界队列，消费过慢时丢弃最旧的事件"""
+
+    def __init__(self, symbols: set[str], queue_max: int):
+        self.symbols = symbols
+        self.queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue(maxsize=queue_max)
+        self.dropped = 0
+
+    def push(self, symbol: str, bar: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((symbol, bar))
+
+
+class KlineBroadcaster:
+    def __init__(self, queue_max: int):
+        self.queue_max = queue_max
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._subs: dict[str, set[Subscriber]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls) -> "KlineBroadcaster":
+        """KLINE_STREAM_QUEUE_MAX: 每个连接最多积压的事件数"""
+        return cls(queue_max=int(os.getenv("KLINE_STREAM_QUEUE_MAX", "1000")))
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def publish_threadsafe(self, symbol: str, bar: dict):
+        """FutuOpenD 回调线程调用；无订阅者时不占用事件循环"""
+        if self._loop is None or not self._subs.get(symbol):
+            return
+        self._loop.call_soon_threadsafe(self._publish, symbol, bar)
+
+    def _publish(self, symbol: str, bar: dict):
+        self.published += 1
+        for sub in tuple(self._subs.get(symbol, ())):
+            before = sub.dropped
+            sub.push(symbol, bar)
+            self.dropped += sub.dropped - before
+
+    def subscribe(self, symbols: list[str]) -> Subscriber:
+        sub = Subscriber(set(symbols), self.queue_max)
+        for s in sub.symbols:
+            self._subs.setdefault(s, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        for s in sub.symbols:
+            subs = self._subs.get(s)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._subs[s]
+
+    def stats(self) -> dict:
+        return {
+            "connections": len({id(sub) for subs in self._subs.values() for sub in subs}),
+            "symbols": {s: len(subs) for s, subs in self._subs.items()},
+            "published": self.published,
+            "dropped": self.dropped,
+        }
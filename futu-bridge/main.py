@@ -3,38 +3,116 @@ futu-bridge: FutuOpenD HTTP 桥接服务
 将 FutuOpenD TCP+Protobuf 协议翻译为标准 JSON REST，供 Node.js trading-app 调用。
 """
 
+import asyncio
+import functools
 import os
-import time
 import logging
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 
-from collections import deque
-import threading
-
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Query, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from futu import (
-    OpenQuoteContext, RET_OK, KLType, AuType, SubType,
+    OpenQuoteContext, RET_OK, KLType, AuType,
     StockQuoteHandlerBase, CurKlineHandlerBase, TradeDateMarket
 )
 
+from executor import FutuExecutor, QueueFullError
+from health import HealthProber
+from kline_cache import KlineCache
+from kline_disk import KlineDisk
+from kline_format import frame_to_klines
+from indicators import IndicatorEngine
+from kline_resample import DERIVED_KTYPES, DerivedKlines
+from kline_store import KlineStore
+from kline_stream import KlineBroadcaster
+from metrics import MetricsMiddleware, MetricsRegistry, add_upstream
+from option_chain import OptionChainCache, days_to_expiry, market_today, strikes_near
+from profiler import Profiler, ProfilingMiddleware, phase
+from quote_pool import QuotePool
+from realtime_buffer import RealtimeKlines
+from rate_limit import PriorityLaneMiddleware, RateScheduler, RateLimitedError, current_lane
+from responses import FastJSONResponse, JSON_BACKEND, dumps
+from snapshot_cache import SnapshotCache
+from subscriptions import SubscriptionManager, QuotaExceededError
+from supervisor import ConnectionSupervisor
+from trading_calendar import CalendarRangeError, TradingCalendar
+from wire_format import resolve_format, render_klines, render_kline_columns
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 log = logging.getLogger("futu-bridge")
 
 FUTU_HOST = os.getenv("FUTU_HOST", "127.0.0.1")
 FUTU_PORT = int(os.getenv("FUTU_PORT", "11111"))
 
-# 全局行情上下文
-quote_ctx: OpenQuoteContext | None = None
+
+def new_quote_ctx() -> OpenQuoteContext:
+    log.info(f"连接 FutuOpenD {FUTU_HOST}:{FUTU_PORT}")
+    return OpenQuoteContext(host=FUTU_HOST, port=FUTU_PORT)
+
+
+# 行情连接池：0 号为主连接（订阅 + 推送），其余请求按最少在途分派
+quote_pool = QuotePool.from_env(new_quote_ctx)
+# 必须走主连接的接口族（订阅状态与推送绑定在连接上）
+PRIMARY_ENDPOINTS = {"subscribe", "health"}
 
 
 def get_ctx() -> OpenQuoteContext:
-    global quote_ctx
-    if quote_ctx is None:
-        log.info(f"连接 FutuOpenD {FUTU_HOST}:{FUTU_PORT}")
-        quote_ctx = OpenQuoteContext(host=FUTU_HOST, port=FUTU_PORT)
-    return quote_ctx
+    return quote_pool.primary()
+
+
+# FutuOpenD 同步调用统一走有界线程池，避免阻塞事件循环
+executor = FutuExecutor.from_env()
+# FutuOpenD 按接口族的频率限额（令牌桶 + 优先级通道）
+rate_scheduler = RateScheduler.from_env()
+# Prometheus 指标（/metrics）
+metrics = MetricsRegistry()
+# 按需开启的请求分段剖析（/profile）
+profiler = Profiler.from_env()
+
+
+async def call_futu(endpoint: str, method: str, *args, **kwargs):
+    """
+    先按接口族取频率令牌，再在执行层线程池中调用连接池中某条连接的 <method>；
+    频率额度等不到时返回 429，执行层排队满时返回 503
+    """
+    try:
+        # 执行层排队已满时直接拒绝，不消耗频率令牌
+        executor.check(endpoint)
+        t0 = time.perf_counter()
+        try:
+            with phase("rate_wait"):
+                await rate_scheduler.acquire(endpoint)
+        finally:
+            t1 = time.perf_counter()
+            metrics.observe_rate_wait(endpoint, current_lane.get(), t1 - t0)
+        slot = quote_pool.pick(primary=endpoint in PRIMARY_ENDPOINTS)
+        try:
+            with phase(method):
+                try:
+                    fut = await executor.submit(endpoint, quote_pool.call, slot, method, *args, **kwargs)
+                except QueueFullError:
+                    # 等令牌期间执行层排满：调用没有发出，退还令牌
+                    rate_scheduler.refund(endpoint)
+                    quote_pool.abandon(slot)
+                    raise
+                except BaseException:
+                    # 排队期间调用方已断开：调用没有发出，不计入连接健康度
+                    quote_pool.abandon(slot)
+                    raise
+                # 连接在线程上的调用结束时才归还，调用方断开时不提前减少在途数
+                fut.add_done_callback(functools.partial(quote_pool.settle, slot))
+                return await asyncio.shield(fut)
+        finally:
+            elapsed = time.perf_counter() - t1
+            metrics.observe_futu_call(endpoint, elapsed)
+            add_upstream(elapsed)
+    except RateLimitedError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 # ---------- Symbol 格式转换 ----------
@@ -62,6 +140,16 @@ def to_futu_symbol(symbol: str) -> str:
     return symbol
 
 
+FUTU_MARKET_PREFIXES = ("US.", "HK.", "SH.", "SZ.")
+
+
+def normalize_symbol(symbol: str) -> str:
+    """任意格式 → FutuOpenD 格式，已是 FutuOpenD 格式则原样返回"""
+    if symbol.startswith(FUTU_MARKET_PREFIXES):
+        return symbol
+    return to_futu_symbol(symbol)
+
+
 def to_longport_symbol(symbol: str) -> str:
     """FutuOpenD 格式 → LongPort 格式: US.SPY → SPY.US"""
     if "." not in symbol:
@@ -73,40 +161,200 @@ def to_longport_symbol(symbol: str) -> str:
     return symbol
 
 
-def format_kline_row(row: dict) -> dict:
-    """将 FutuOpenD K 线 DataFrame 行转为标准 JSON"""
-    time_key = row.get("time_key", "")
-    if isinstance(time_key, str) and time_key:
-        try:
-            ts = int(datetime.strptime(time_key, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
-        except ValueError:
-            try:
-                ts = int(datetime.strptime(time_key, "%Y-%m-%d").timestamp() * 1000)
-            except ValueError:
-                ts = 0
-    else:
-        ts = 0
+# ---------- K 线历史加载 ----------
 
-    return {
-        "timestamp": ts,
-        "open": float(row.get("open", 0)),
-        "high": float(row.get("high", 0)),
-        "low": float(row.get("low", 0)),
-        "close": float(row.get("close", 0)),
-        "volume": int(row.get("volume", 0)),
-        "turnover": float(row.get("turnover", 0)),
-    }
+kline_cache = KlineCache.from_env()
+# 本地 SQLite 持久化（KLINE_DISK_PATH 为空时关闭）
+kline_disk = KlineDisk.from_env()
+kline_store = KlineStore.from_env(kline_disk)
+
+
+async def load_kline(futu_sym: str, kl_type, ktype: str, count: int) -> list[dict]:
+    """获取最后 count 根已格式化的历史 K 线：1min 推送合成的派生 K 线 → 进程内缓存 → 增量存储（只拉尾部）"""
+    with phase("derived_klines"):
+        derived = derived_klines.serve(
+            futu_sym, ktype, count, subscriptions.subscribed_at(futu_sym, "K_1M"), kline_store.peek(futu_sym, ktype),
+        )
+    if derived is not None:
+        return derived
+
+    with phase("kline_cache"):
+        cached = kline_cache.get(futu_sym, ktype, count)
+    if cached is not None:
+        return cached
+
+    def window_start(n: int) -> str:
+        if kl_type in (KLType.K_DAY, KLType.K_WEEK):
+            return (datetime.now() - timedelta(days=max(n * 2, 200))).strftime("%Y-%m-%d")
+        # 分钟级数据只需几天
+        return (datetime.now() - timedelta(days=max(n // 78 + 2, 5))).strftime("%Y-%m-%d")
+
+    async def fetch(start_date: str) -> list[dict]:
+        return await fetch_history_kline(futu_sym, kl_type, start_date)
+
+    with phase("kline_store"):
+        klines = await kline_store.read(futu_sym, ktype, count, window_start, fetch)
+    kline_cache.put(futu_sym, ktype, count, klines)
+    return klines
+
+
+async def fetch_history_kline(futu_sym: str, kl_type, start_date: str) -> list[dict]:
+    """从 FutuOpenD 拉取 start_date 至今的全部 K 线（自动翻页）"""
+    end_date = datetime.now().strftime("%Y-%m-%d")
+    klines: list[dict] = []
+    page_req_key = None
+    while True:
+        ret, data, page_req_key = await call_futu(
+            "kline", "request_history_kline",
+            code=futu_sym,
+            start=start_date,
+            end=end_date,
+            ktype=kl_type,
+            autype=AuType.QFQ,
+            page_req_key=page_req_key,
+        )
+
+        if ret != RET_OK:
+            raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
+
+        with phase("frame_to_klines"):
+            klines.extend(frame_to_klines(data))
+        if page_req_key is None:
+            return klines
+
+
+# 单次批量请求最多条目数
+KLINE_BATCH_MAX = int(os.getenv("KLINE_BATCH_MAX", "50"))
 
 
 # ---------- K 线实时订阅缓冲 ----------
 
-# 订阅标的列表
+# 常驻订阅标的列表（其他标的通过 /subscriptions 按需订阅）
 SUBSCRIBE_SYMBOLS = ["US.SPY", "US.UUP", "US.IBIT"]
-# 每个标的最多保留 120 根 1min K 线（2 小时）
-KLINE_BUFFER_MAX = 120
+# 每个标的保留的 1min K 线根数（环形缓冲预分配，默认约 2.5 个美股交易日）
+KLINE_BUFFER_MAX = int(os.getenv("KLINE_BUFFER_MAX", "1000"))
+
+realtime_klines = RealtimeKlines(KLINE_BUFFER_MAX)
+# 由 1min 推送合成 5/15/30/60 分钟 K 线，已订阅 1min 的标的 /kline 直接从内存返回
+derived_klines = DerivedKlines.from_env(realtime_klines)
+# 1min 及派生周期上的增量技术指标
+indicator_engine = IndicatorEngine.from_env()
+# 推送到 SSE / WebSocket 流式连接
+kline_stream = KlineBroadcaster.from_env()
+# 运行时订阅管理（常驻 SUBSCRIBE_SYMBOLS + 按需订阅）
+subscriptions = SubscriptionManager.from_env(lambda method, *args, **kwargs: call_futu("subscribe", method, *args, **kwargs))
+
+
+# 实时 1min K 线刷盘间隔（秒）
+REALTIME_FLUSH_INTERVAL = float(os.getenv("REALTIME_FLUSH_INTERVAL", "60"))
+# 各标的已落盘的最后一根 K 线时间（该根可能仍未收线，下次连同它一起重写）
+_realtime_flushed: dict[str, int] = {}
+
+
+def flush_realtime():
+    """把实时缓冲中上次落盘之后的 K 线写入磁盘（后台执行，不等待）"""
+    for code in realtime_klines.symbols():
+        bars = realtime_klines.read(code, since=_realtime_flushed.get(code))
+        if bars:
+            kline_disk.save_realtime(code, bars, KLINE_BUFFER_MAX)
+            _realtime_flushed[code] = bars[-1]["timestamp"]
+
+
+async def _realtime_flush_loop():
+    while True:
+        await asyncio.sleep(REALTIME_FLUSH_INTERVAL)
+        try:
+            flush_realtime()
+        except Exception as e:
+            log.warning(f"实时 K 线刷盘失败: {e}")
+
+
+async def warm_start_realtime():
+    """启动时用磁盘上的实时 K 线回填缓冲；停机期间的缺口不在这里补"""
+    try:
+        saved = await kline_disk.load_realtime(KLINE_BUFFER_MAX)
+    except Exception as e:
+        log.warning(f"实时 K 线预热失败: {e}")
+        return
+    total = 0
+    for code, bars in saved.items():
+        total += realtime_klines.restore(code, bars)
+        if bars:
+            _realtime_flushed[code] = bars[-1]["timestamp"]
+    if saved:
+        log.info(f"实时 K 线预热: {len(saved)} 个标的, {total} 根")
+
+
+# ---------- 断线恢复 ----------
+
+# 多久没有收到推送视为停滞（秒）；休市时段所有标的都会停滞
+REALTIME_STALE_AFTER = float(os.getenv("REALTIME_STALE_AFTER", "120"))
+# 主连接断开时各标的缓冲中的最后一根 K 线时间，恢复后从这里开始补
+_gap_start: dict[str, int] = {}
+
+
+def mark_disconnected():
+    for code in realtime_klines.symbols():
+        last = realtime_klines.snapshot(code, limit=1)
+        if len(last):
+            _gap_start.setdefault(code, int(last["timestamp"][0]))
+
+
+async def backfill_realtime(code: str) -> int:
+    """
+    从历史 K 线补齐断线期间缺失的 1min K 线（推送可能已先于补数据恢复，缺口在缓冲中间），
+    补入的 K 线同时推给流式连接
+    """
+    since = _gap_start.get(code)
+    if since is None:
+        # 没观察到断开（重连快于巡检间隔）：从最后一根开始补
+        last = realtime_klines.snapshot(code, limit=1)
+        if not len(last):
+            return 0
+        since = int(last["timestamp"][0])
+    start = datetime.fromtimestamp(since / 1000).strftime("%Y-%m-%d")
+    bars = await fetch_history_kline(code, KLType.K_1M, start)
+    added = realtime_klines.backfill(code, [b for b in bars if b["timestamp"] >= since])
+    _gap_start.pop(code, None)
+    if added and code in _realtime_flushed:
+        # 补入的 K 线早于已落盘位置，下次刷盘从缺口处重写
+        _realtime_flushed[code] = min(_realtime_flushed[code], added[0]["timestamp"])
+    for bar in added:
+        kline_stream.publish_threadsafe(code, bar)
+    return len(added)
+
+
+async def recover_after_reconnect(downtime: float):
+    """主连接恢复后：补上常驻订阅、按订阅表重新订阅、补齐断线期间缺失的 1min K 线"""
+    current_lane.set("background")
+    missing = [c for c in SUBSCRIBE_SYMBOLS if not subscriptions.is_subscribed(c, "K_1M")]
+    if missing:
+        await subscriptions.acquire(missing, ["K_1M"], pinned=True)
+    resubscribed = await subscriptions.resubscribe()
+    codes = subscriptions.codes("K_1M")
+    results = await asyncio.gather(*(backfill_realtime(c) for c in codes), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    filled = sum(r for r in results if not isinstance(r, BaseException))
+    log.info(f"断线恢复: 断开 {downtime:.1f}s，重新订阅 {resubscribed} 项，补齐 {filled} 根 1min K 线")
+    if errors:
+        raise RuntimeError(f"{len(errors)} 个标的补数据失败: {errors[0]}")
 
-kline_buffers: dict[str, deque] = {}
-kline_lock = threading.Lock()
+
+supervisor = ConnectionSupervisor.from_env(quote_pool, mark_disconnected, recover_after_reconnect)
+
+
+def realtime_staleness(code: str, now: float | None = None) -> dict:
+    age = realtime_klines.push_age(code, now)
+    return {
+        "last_push_age_s": round(age, 3) if age is not None else None,
+        "stale": not supervisor.connected() or age is None or age > REALTIME_STALE_AFTER,
+    }
+
+
+def subscribed_staleness() -> list[dict]:
+    """各 1min 订阅标的的推送停滞状态"""
+    now = time.time()
+    return [{"symbol": to_longport_symbol(c), **realtime_staleness(c, now)} for c in subscriptions.codes("K_1M")]
 
 
 class KlineHandler(CurKlineHandlerBase):
@@ -115,27 +363,12 @@ class KlineHandler(CurKlineHandlerBase):
     def on_recv_rsp(self, rsp_pb):
         ret, data = super().on_recv_rsp(rsp_pb)
         if ret == RET_OK and data is not None and not data.empty:
-            for _, row in data.iterrows():
-                code = row.get("code", "")
-                time_key = row.get("time_key", "")
-                try:
-                    ts = int(datetime.strptime(time_key, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
-                except (ValueError, TypeError):
-                    ts = int(time.time() * 1000)
-
-                bar = {
-                    "timestamp": ts,
-                    "open": float(row.get("open", 0)),
-                    "high": float(row.get("high", 0)),
-                    "low": float(row.get("low", 0)),
-                    "close": float(row.get("close", 0)),
-                    "volume": int(row.get("volume", 0)),
-                    "turnover": float(row.get("turnover", 0)),
-                }
-                with kline_lock:
-                    if code not in kline_buffers:
-                        kline_buffers[code] = deque(maxlen=KLINE_BUFFER_MAX)
-                    kline_buffers[code].append(bar)
+            written = realtime_klines.ingest(data)
+            for code, bar in written:
+                kline_stream.publish_threadsafe(code, bar)
+            indicator_engine.on_bars("K_1M", written)
+            for ktype, bars in derived_klines.on_bars(written).items():
+                indicator_engine.on_bars(ktype, bars)
         return RET_OK, data
 
 
@@ -144,6 +377,12 @@ class KlineHandler(CurKlineHandlerBase):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     log.info(f"futu-bridge 启动，目标 FutuOpenD: {FUTU_HOST}:{FUTU_PORT}")
+    kline_stream.bind_loop(asyncio.get_running_loop())
+    flush_task = None
+    if kline_disk is not None:
+        # 先回填再订阅，推送到达时直接接在磁盘数据之后
+        await warm_start_realtime()
+        flush_task = asyncio.create_task(_realtime_flush_loop())
     try:
         ctx = get_ctx()
         ret, state = ctx.get_global_state()
@@ -152,41 +391,200 @@ async def lifespan(app: FastAPI):
         else:
             log.warning(f"FutuOpenD 全局状态获取失败: {state}")
 
-        # 注册 K 线推送处理器 + 订阅 1min K 线
+        # 注册 K 线推送处理器 + 常驻订阅 1min K 线
         ctx.set_handler(KlineHandler())
-        sub_ret, sub_err = ctx.subscribe(SUBSCRIBE_SYMBOLS, [SubType.K_1M], subscribe_push=True)
-        if sub_ret == RET_OK:
-            log.info(f"K 线实时订阅成功: {SUBSCRIBE_SYMBOLS}")
-        else:
-            log.warning(f"K 线实时订阅失败: {sub_err}")
+        await subscriptions.acquire(SUBSCRIBE_SYMBOLS, ["K_1M"], pinned=True)
+        log.info(f"K 线实时订阅成功: {SUBSCRIBE_SYMBOLS}")
     except Exception as e:
         log.error(f"FutuOpenD 初始连接/订阅失败: {e}")
+    subscriptions.start()
+    supervisor.start()
+    health_prober.start()
     yield
-    if quote_ctx is not None:
-        # 取消订阅后关闭
+    health_prober.stop()
+    supervisor.stop()
+    subscriptions.stop()
+    if flush_task is not None:
+        flush_task.cancel()
+        flush_realtime()
+        kline_disk.close()
+    if quote_pool.contexts():
+        # 取消全部订阅后关闭
         try:
-            quote_ctx.unsubscribe(SUBSCRIBE_SYMBOLS, [SubType.K_1M])
+            quote_pool.primary().unsubscribe_all()
         except Exception:
             pass
-        quote_ctx.close()
+        quote_pool.close()
         log.info("FutuOpenD 连接已关闭")
+    executor.shutdown()
 
 
-app = FastAPI(title="futu-bridge", version="1.0.0", lifespan=lifespan)
+app = FastAPI(title="futu-bridge", version="1.0.0", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(PriorityLaneMiddleware)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+# 最后添加的中间件在最外层，请求耗时包含优先级中间件与响应发送
+app.add_middleware(MetricsMiddleware, registry=metrics)
 
 
 # ---------- 路由 ----------
 
+async def probe_futu() -> dict:
+    ret, state = await call_futu("health", "get_global_state")
+    if ret != RET_OK:
+        raise RuntimeError(str(state))
+    return state
+
+
+# 后台探测 FutuOpenD，/health 读缓存
+health_prober = HealthProber.from_env(probe_futu)
+
+
 @app.get("/health")
 async def health():
-    try:
-        ctx = get_ctx()
-        ret, state = ctx.get_global_state()
-        if ret == RET_OK:
-            return {"status": "ok", "futu_host": FUTU_HOST, "futu_port": FUTU_PORT}
-        return JSONResponse(status_code=503, content={"status": "degraded", "error": str(state)})
-    except Exception as e:
-        return JSONResponse(status_code=503, content={"status": "error", "error": str(e)})
+    """从内存返回最近一次后台探测结果，不访问 FutuOpenD"""
+    probe = health_prober.snapshot()
+    if probe["ok"]:
+        return {"status": "ok", "futu_host": FUTU_HOST, "futu_port": FUTU_PORT,
+                "latency_ms": probe["latency_ms"], "checked_at": probe["checked_at"]}
+    return JSONResponse(status_code=503, content={"status": "degraded", "error": probe["error"],
+                                                  "checked_at": probe["checked_at"]})
+
+
+@app.get("/health/deep")
+async def health_deep():
+    """立即探测一次 FutuOpenD，并报告连接状态与各 1min 订阅标的推送是否停滞"""
+    ok = await health_prober.probe()
+    symbols = subscribed_staleness()
+    stale = sum(1 for s in symbols if s["stale"])
+    body = {
+        "status": "ok" if ok and supervisor.connected() else "degraded",
+        "probe": health_prober.snapshot(),
+        "global_state": health_prober.state,
+        "connected": supervisor.connected(),
+        "pool": quote_pool.stats(),
+        "stale_after_s": REALTIME_STALE_AFTER,
+        "stale": stale,
+        "symbols": symbols,
+    }
+    return FastJSONResponse(body, status_code=200 if body["status"] == "ok" else 503)
+
+
+@app.get("/stats")
+async def stats():
+    """桥接层内部运行指标：执行层排队深度/并发/耗时、K 线缓存命中率、增量存储回源量"""
+    return {
+        "json_backend": JSON_BACKEND,
+        "executor": executor.stats(),
+        "quote_pool": quote_pool.stats(),
+        "rate_limits": rate_scheduler.stats(),
+        "kline_cache": kline_cache.stats(),
+        "kline_store": kline_store.stats(),
+        "kline_disk": kline_disk.stats() if kline_disk is not None else None,
+        "realtime": realtime_klines.stats(),
+        "snapshot_cache": snapshot_cache.stats(),
+        "option_chain": option_chains.stats(),
+        "option_snapshot_cache": option_snapshot_cache.stats(),
+        "derived_klines": derived_klines.stats(),
+        "indicators": indicator_engine.stats(),
+        "kline_stream": kline_stream.stats(),
+        "subscriptions": subscriptions.stats(),
+        "supervisor": supervisor.stats(),
+        "health": health_prober.snapshot(),
+        "trading_calendar": trading_calendar.stats(),
+        "profiler": profiler.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus 文本格式指标：按路由的请求数与耗时直方图（total / upstream / serialize）、
+    FutuOpenD 调用耗时、频率令牌等待；其余为抓取时从各组件 stats() 生成的计数器与仪表
+    """
+    realtime = realtime_klines.stats()
+    rate = rate_scheduler.stats()["families"]
+    caches = {
+        "kline_cache": kline_cache.stats(),
+        "snapshot_cache": snapshot_cache.stats(),
+        "option_chain": option_chains.stats(),
+        "option_snapshot_cache": option_snapshot_cache.stats(),
+    }
+    lanes = [(family, lane, s) for family, b in rate.items() for lane, s in b["lanes"].items()]
+    families = [
+        ("futu_bridge_push_bars_total", "counter", "按标的累计收到的 1min K 线推送根数",
+         [({"symbol": code}, n) for code, n in sorted(realtime_klines.push_counts().items())]),
+        ("futu_bridge_push_messages_total", "counter", "收到的 K 线推送消息数",
+         [({}, realtime["pushes"])]),
+        ("futu_bridge_realtime_buffer_depth", "gauge", "实时 1min 环形缓冲中的 K 线根数",
+         [({"symbol": code}, n) for code, n in sorted(realtime["depth"].items())]),
+        ("futu_bridge_derived_buffer_depth", "gauge", "派生周期环形缓冲中的 K 线根数（所有标的合计）",
+         [({"ktype": ktype}, n) for ktype, n in derived_klines.stats()["depth"].items()]),
+        ("futu_bridge_cache_hits_total", "counter", "缓存命中次数",
+         [({"cache": name}, s["hits"]) for name, s in caches.items()]),
+        ("futu_bridge_cache_misses_total", "counter", "缓存未命中次数",
+         [({"cache": name}, s["misses"]) for name, s in caches.items()]),
+        ("futu_bridge_cache_hit_ratio", "gauge", "缓存命中率（快照缓存含合并请求）",
+         [({"cache": name}, s["hit_ratio"]) for name, s in caches.items()]),
+        ("futu_bridge_rate_limit_queued", "gauge", "正在等待频率令牌的请求数",
+         [({"family": f, "lane": lane}, s["queued"]) for f, lane, s in lanes]),
+        ("futu_bridge_rate_limit_delayed_total", "counter", "需要排队等待令牌的请求数",
+         [({"family": f, "lane": lane}, s["delayed"]) for f, lane, s in lanes]),
+        ("futu_bridge_rate_limit_rejected_total", "counter", "等不到令牌被拒绝（429）的请求数",
+         [({"family": f, "lane": lane}, s["rejected"] + s["expired"]) for f, lane, s in lanes]),
+        ("futu_bridge_executor_waiting", "gauge", "执行层排队中的 FutuOpenD 调用数",
+         [({"endpoint": e}, s["waiting"]) for e, s in executor.stats()["endpoints"].items()]),
+        ("futu_bridge_stream_connections", "gauge", "K 线流式推送连接数",
+         [({}, kline_stream.stats()["connections"])]),
+        ("futu_bridge_futu_connected", "gauge", "FutuOpenD 主连接是否可用",
+         [({}, int(supervisor.connected()))]),
+    ]
+    return PlainTextResponse(metrics.render(families), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class ProfileConfig(BaseModel):
+    enabled: bool | None = Field(None, description="是否按 sample_rate 抽样剖析")
+    sample_rate: float | None = Field(None, ge=0, le=1, description="被剖析的请求比例")
+    clear: bool = Field(False, description="清空已保存的记录")
+
+
+@app.get("/profile")
+async def get_profile(
+    fmt: str = Query("json", alias="format", description="json（逐条分段明细）或 folded（火焰图 folded stacks）"),
+    limit: int = Query(20, ge=1, description="json 格式最多返回最慢的 limit 条"),
+):
+    """最近窗口内最慢的请求剖析记录；请求带 X-Profile: 1 头或经 POST /profile 开启抽样后产生"""
+    if fmt == "folded":
+        return PlainTextResponse(profiler.folded())
+    if fmt != "json":
+        raise HTTPException(status_code=400, detail=f"不支持的 format: {fmt}，支持: ['json', 'folded']")
+    return FastJSONResponse({**profiler.stats(), "data": [t.to_dict() for t in profiler.traces()[:limit]]})
+
+
+@app.post("/profile")
+async def configure_profile(req: ProfileConfig):
+    """运行时开关抽样剖析、调整抽样比例或清空记录"""
+    profiler.configure(req.enabled, req.sample_rate, req.clear)
+    log.info(f"请求剖析: enabled={profiler.enabled}, sample_rate={profiler.sample_rate}")
+    return profiler.stats()
+
+
+@app.get("/connection")
+async def get_connection():
+    """FutuOpenD 连接状态（断开/重连/恢复次数）及各 1min 订阅标的推送是否停滞"""
+    symbols = subscribed_staleness()
+    return {
+        "supervisor": supervisor.stats(),
+        "pool": quote_pool.stats(),
+        "stale_after_s": REALTIME_STALE_AFTER,
+        "stale": sum(1 for s in symbols if s["stale"]),
+        "symbols": symbols,
+    }
+
+
+@app.get("/rate-limits")
+async def get_rate_limits():
+    """各接口族当前令牌余量、各优先级通道排队数与等待耗时"""
+    return rate_scheduler.stats()
 
 
 @app.get("/kline")
@@ -194,120 +592,550 @@ async def get_kline(
     symbol: str = Query(..., description="FutuOpenD 或 LongPort 格式，如 US.SPY 或 SPY.US"),
     ktype: str = Query("K_DAY", description="K 线类型: K_DAY, K_1M, K_5M 等"),
     count: int = Query(100, ge=1, le=1000, description="请求 K 线数量"),
+    fmt: str | None = Query(None, alias="format", description="响应格式: json(默认), columnar, msgpack"),
+    accept: str | None = Header(None),
 ):
     """获取历史 K 线数据"""
-    futu_sym = to_futu_symbol(symbol) if "." in symbol and not symbol.startswith("US.") and not symbol.startswith("HK.") else symbol
-    # 如果已经是 FutuOpenD 格式就直接用
-    if not futu_sym.startswith(("US.", "HK.", "SH.", "SZ.")):
-        futu_sym = to_futu_symbol(symbol)
+    futu_sym = normalize_symbol(symbol)
 
     kl_type = KTYPE_MAP.get(ktype.upper())
     if kl_type is None:
         raise HTTPException(status_code=400, detail=f"不支持的 ktype: {ktype}，支持: {list(KTYPE_MAP.keys())}")
+    wire = resolve_format(fmt, accept)
 
     try:
-        ctx = get_ctx()
+        klines = await load_kline(futu_sym, kl_type, ktype.upper(), count)
+        meta = {"source": "futu", "symbol": to_longport_symbol(futu_sym), "ktype": ktype}
+        return render_klines(meta, klines, wire)
 
-        # 计算 start/end 日期
-        end_date = datetime.now().strftime("%Y-%m-%d")
-        if kl_type in (KLType.K_DAY, KLType.K_WEEK):
-            start_date = (datetime.now() - timedelta(days=max(count * 2, 200))).strftime("%Y-%m-%d")
-        else:
-            # 分钟级数据只需几天
-            start_date = (datetime.now() - timedelta(days=max(count // 78 + 2, 5))).strftime("%Y-%m-%d")
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error(f"获取 K 线失败: symbol={futu_sym}, ktype={ktype}, error={e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        ret, data, _ = ctx.request_history_kline(
-            code=futu_sym,
-            start=start_date,
-            end=end_date,
-            ktype=kl_type,
-            autype=AuType.QFQ,
-        )
 
-        if ret != RET_OK:
-            raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
+class KlineBatchItem(BaseModel):
+    symbol: str = Field(..., description="FutuOpenD 或 LongPort 格式，如 US.SPY 或 SPY.US")
+    ktype: str = Field("K_DAY", description="K 线类型: K_DAY, K_1M, K_5M 等")
+    count: int = Field(100, ge=1, le=1000, description="请求 K 线数量")
 
-        rows = data.to_dict("records")
-        # 只取最后 count 条
-        rows = rows[-count:] if len(rows) > count else rows
-        klines = [format_kline_row(r) for r in rows]
 
-        return {
-            "source": "futu",
-            "symbol": to_longport_symbol(futu_sym),
-            "ktype": ktype,
-            "count": len(klines),
-            "data": klines,
-        }
+class KlineBatchRequest(BaseModel):
+    items: list[KlineBatchItem] = Field(..., min_length=1, max_length=KLINE_BATCH_MAX)
 
-    except HTTPException:
-        raise
+
+async def _load_batch_item(item: KlineBatchItem) -> dict:
+    futu_sym = normalize_symbol(item.symbol)
+    result = {"symbol": to_longport_symbol(futu_sym), "ktype": item.ktype}
+    kl_type = KTYPE_MAP.get(item.ktype.upper())
+    if kl_type is None:
+        return {**result, "status": 400, "error": f"不支持的 ktype: {item.ktype}"}
+    try:
+        klines = await load_kline(futu_sym, kl_type, item.ktype.upper(), item.count)
+        return {**result, "status": 200, "count": len(klines), "data": klines}
+    except HTTPException as e:
+        return {**result, "status": e.status_code, "error": str(e.detail)}
     except Exception as e:
-        log.error(f"获取 K 线失败: symbol={futu_sym}, ktype={ktype}, error={e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error(f"批量获取 K 线失败: symbol={futu_sym}, ktype={item.ktype}, error={e}")
+        return {**result, "status": 500, "error": str(e)}
+
+
+@app.post("/kline/batch")
+async def get_kline_batch(req: KlineBatchRequest):
+    """批量获取多个 (symbol, ktype, count) 的历史 K 线，并发回源，单项失败不影响其他项"""
+    results = await asyncio.gather(*(_load_batch_item(item) for item in req.items))
+    return FastJSONResponse({
+        "source": "futu",
+        "count": len(results),
+        "errors": sum(1 for r in results if r["status"] != 200),
+        "results": results,
+    })
+
+
+# ---------- 市场快照 ----------
+
+snapshot_cache = SnapshotCache.from_env()
+
+
+def _snapshot_row(r: dict) -> dict:
+    return {
+        "symbol": to_longport_symbol(r.get("code", "")),
+        "last_price": float(r.get("last_price", 0)),
+        "open": float(r.get("open_price", 0)),
+        "high": float(r.get("high_price", 0)),
+        "low": float(r.get("low_price", 0)),
+        "prev_close": float(r.get("prev_close_price", 0)),
+        "volume": int(r.get("volume", 0)),
+        "turnover": float(r.get("turnover", 0)),
+        "change_rate": float(r.get("change_rate", 0)),
+    }
+
+
+async def fetch_snapshots(futu_symbols: list[str]) -> dict[str, dict]:
+    """向 FutuOpenD 拉取一块快照（不超过 SNAPSHOT_CHUNK_SIZE 个），返回 FutuOpenD 代码 → 快照行"""
+    ret, data = await call_futu("snapshot", "get_market_snapshot", futu_symbols)
+    if ret != RET_OK:
+        raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
+    with phase("to_dict"):
+        return {r.get("code", ""): _snapshot_row(r) for r in data.to_dict("records")}
 
 
 @app.get("/snapshot")
 async def get_snapshot(
     symbols: str = Query(..., description="逗号分隔的 symbol 列表，如 US.SPY,US.UUP,US.IBIT"),
 ):
-    """获取市场快照（无需订阅）"""
+    """获取市场快照（无需订阅）；按标的短 TTL 缓存，并发请求合并回源，大列表自动切块并发拉取"""
     symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
     if not symbol_list:
         raise HTTPException(status_code=400, detail="symbols 参数不能为空")
 
     # 统一转为 FutuOpenD 格式
-    futu_symbols = []
-    for s in symbol_list:
-        if s.startswith(("US.", "HK.", "SH.", "SZ.")):
-            futu_symbols.append(s)
-        else:
-            futu_symbols.append(to_futu_symbol(s))
+    futu_symbols = [normalize_symbol(s) for s in symbol_list]
 
     try:
-        ctx = get_ctx()
-        ret, data = ctx.get_market_snapshot(futu_symbols)
+        rows = await snapshot_cache.get(futu_symbols, fetch_snapshots)
+        results = [rows[s] for s in dict.fromkeys(futu_symbols) if s in rows]
+        return FastJSONResponse({"source": "futu", "data": results})
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error(f"获取快照失败: symbols={futu_symbols}, error={e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---------- 期权链 ----------
+
+option_chains = OptionChainCache.from_env()
+# 期权快照行与正股快照行字段不同，单独一份缓存，避免同一代码经 /snapshot 写入正股格式的行
+option_snapshot_cache = SnapshotCache.from_env()
+OPTION_TYPES = ("ALL", "CALL", "PUT")
+
+
+def _num(v) -> float | None:
+    """FutuOpenD 对无报价的字段返回 NaN / "N/A"，统一转为 None"""
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+    return None if v != v else v
+
+
+def _option_snapshot_row(r: dict) -> dict:
+    return {
+        "symbol": to_longport_symbol(r.get("code", "")),
+        "last_price": _num(r.get("last_price")),
+        "bid": _num(r.get("bid_price")),
+        "ask": _num(r.get("ask_price")),
+        "bid_vol": _num(r.get("bid_vol")),
+        "ask_vol": _num(r.get("ask_vol")),
+        "open": _num(r.get("open_price")),
+        "high": _num(r.get("high_price")),
+        "low": _num(r.get("low_price")),
+        "prev_close": _num(r.get("prev_close_price")),
+        "volume": int(_num(r.get("volume")) or 0),
+        "turnover": _num(r.get("turnover")),
+        "open_interest": _num(r.get("option_open_interest")),
+        "implied_volatility": _num(r.get("option_implied_volatility")),
+        "delta": _num(r.get("option_delta")),
+        "gamma": _num(r.get("option_gamma")),
+        "vega": _num(r.get("option_vega")),
+        "theta": _num(r.get("option_theta")),
+        "rho": _num(r.get("option_rho")),
+        "update_time": r.get("update_time", ""),
+    }
+
+
+async def fetch_option_snapshots(futu_symbols: list[str]) -> dict[str, dict]:
+    ret, data = await call_futu("snapshot", "get_market_snapshot", futu_symbols)
+    if ret != RET_OK:
+        raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
+    with phase("to_dict"):
+        return {r.get("code", ""): _option_snapshot_row(r) for r in data.to_dict("records")}
+
+
+async def load_option_expirations(code: str) -> list[str]:
+    async def fetch() -> list[str]:
+        ret, data = await call_futu("option_expiry", "get_option_expiration_date", code)
+        if ret != RET_OK:
+            raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
+        # 只缓存日期：option_expiry_date_distance 在缓存期内跨日后会过时
+        return sorted(str(r["strike_time"])[:10] for r in data.to_dict("records"))
+
+    return await option_chains.expirations(code, fetch)
+
+
+async def load_option_chain(code: str, expiry: str) -> list[dict]:
+    async def fetch() -> list[dict]:
+        ret, data = await call_futu("option_chain", "get_option_chain", code=code, start=expiry, end=expiry)
         if ret != RET_OK:
             raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
+        with phase("to_dict"):
+            contracts = [
+                {
+                    "symbol": to_longport_symbol(r["code"]),
+                    "code": r["code"],
+                    "name": r.get("name", ""),
+                    "type": r.get("option_type", ""),
+                    "strike": float(r["strike_price"]),
+                    "expiry": str(r.get("strike_time", ""))[:10],
+                    "lot_size": int(r.get("lot_size", 0)),
+                    "suspended": bool(r.get("suspension", False)),
+                }
+                for r in data.to_dict("records")
+            ]
+        contracts.sort(key=lambda c: (c["strike"], c["type"]))
+        return contracts
+
+    return await option_chains.chain(code, expiry, fetch)
+
+
+@app.get("/options/expirations")
+async def get_option_expirations(
+    symbol: str = Query(..., description="标的，FutuOpenD 或 LongPort 格式，如 US.SPY 或 SPY.US"),
+):
+    """期权到期日列表（升序），days_to_expiry 按标的市场当地日期计算，0 即当日到期"""
+    code = normalize_symbol(symbol)
+    expirations = await load_option_expirations(code)
+    today = market_today(code)
+    return FastJSONResponse({
+        "source": "futu",
+        "symbol": to_longport_symbol(code),
+        "data": [{"date": d, "days_to_expiry": days_to_expiry(d, today)} for d in expirations],
+    })
+
+
+@app.get("/options/chain")
+async def get_option_chain(
+    symbol: str = Query(..., description="标的，FutuOpenD 或 LongPort 格式，如 US.SPY 或 SPY.US"),
+    expiry: str | None = Query(None, description="到期日 YYYY-MM-DD，缺省为最近一个未过期的到期日（当日到期即 0DTE）"),
+    option_type: str = Query("ALL", description="ALL / CALL / PUT"),
+    strike_min: float | None = Query(None, description="最低行权价（含）"),
+    strike_max: float | None = Query(None, description="最高行权价（含）"),
+    strikes_around: int | None = Query(None, ge=0, le=100,
+                                       description="以离标的现价最近的行权价为中心上下各取 n 档，与 strike_min/max 同时给出时取交集"),
+    quotes: bool = Query(True, description="是否附带所选合约的快照行情（批量拉取）"),
+):
+    """
+    单次调用完成期权选约：到期日 → 期权链（短 TTL 缓存）→ 行权价/类型筛选 → 所选合约批量快照。
+    data 按行权价升序，每个合约一行；quotes=true 时合并快照字段（报价、成交、持仓、IV、希腊值）
+    """
+    code = normalize_symbol(symbol)
+    option_type = option_type.upper()
+    if option_type not in OPTION_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的 option_type: {option_type}，支持: {list(OPTION_TYPES)}")
+    if expiry is not None:
+        try:
+            datetime.strptime(expiry, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"日期格式错误: {expiry}，应为 YYYY-MM-DD")
+
+    try:
+        expirations = await load_option_expirations(code)
+        today = market_today(code)
+        if expiry is None:
+            # 到期日列表可能是跨日前缓存的，按当地日期重新判断是否已过期
+            today_str = today.isoformat()
+            selected = next((d for d in expirations if d >= today_str), None)
+            if selected is None:
+                raise HTTPException(status_code=404, detail=f"{symbol} 没有未到期的期权")
+        else:
+            if expiry not in expirations:
+                raise HTTPException(status_code=404, detail=f"{symbol} 没有 {expiry} 到期的期权")
+            selected = expiry
+
+        async def underlying_snapshot() -> dict[str, dict]:
+            if strikes_around is not None:
+                return await snapshot_cache.get([code], fetch_snapshots)
+            if not quotes:
+                return {}
+            # 只为附带展示的现价：失败时返回 underlying_price=null，不影响期权链本身
+            try:
+                return await snapshot_cache.get([code], fetch_snapshots)
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else e
+                log.warning(f"获取期权标的现价失败: symbol={code}, error={detail}")
+                return {}
+
+        # 期权链与标的现价并发获取
+        chain, underlying = await asyncio.gather(load_option_chain(code, selected), underlying_snapshot())
+        underlying_price = underlying[code]["last_price"] if code in underlying else None
+
+        contracts = [c for c in chain if option_type == "ALL" or c["type"] == option_type]
+        lo = strike_min if strike_min is not None else float("-inf")
+        hi = strike_max if strike_max is not None else float("inf")
+        if strikes_around is not None and contracts:
+            if underlying_price is None:
+                raise HTTPException(status_code=502, detail=f"无法获取 {symbol} 现价，不能按 strikes_around 筛选")
+            near_lo, near_hi = strikes_near(sorted({c["strike"] for c in contracts}), underlying_price, strikes_around)
+            lo, hi = max(lo, near_lo), min(hi, near_hi)
+        contracts = [c for c in contracts if lo <= c["strike"] <= hi]
 
-        rows = data.to_dict("records")
-        results = []
-        for r in rows:
-            results.append({
-                "symbol": to_longport_symbol(r.get("code", "")),
-                "last_price": float(r.get("last_price", 0)),
-                "open": float(r.get("open_price", 0)),
-                "high": float(r.get("high_price", 0)),
-                "low": float(r.get("low_price", 0)),
-                "prev_close": float(r.get("prev_close_price", 0)),
-                "volume": int(r.get("volume", 0)),
-                "turnover": float(r.get("turnover", 0)),
-                "change_rate": float(r.get("change_rate", 0)),
-            })
-
-        return {"source": "futu", "data": results}
+        if quotes and contracts:
+            rows = await option_snapshot_cache.get([c["code"] for c in contracts], fetch_option_snapshots)
+            contracts = [{**c, **rows[c["code"]]} if c["code"] in rows else c for c in contracts]
+
+        return FastJSONResponse({
+            "source": "futu",
+            "symbol": to_longport_symbol(code),
+            "expiry": selected,
+            "days_to_expiry": days_to_expiry(selected, today),
+            "underlying_price": underlying_price,
+            "count": len(contracts),
+            "data": contracts,
+        })
 
     except HTTPException:
         raise
     except Exception as e:
-        log.error(f"获取快照失败: symbols={futu_symbols}, error={e}")
+        log.error(f"获取期权链失败: symbol={code}, expiry={expiry}, error={e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/options/snapshot")
+async def get_option_snapshot(
+    symbols: str = Query(..., description="逗号分隔的期权代码，如 US.SPY260116C600000"),
+):
+    """期权合约快照（报价、成交、持仓、IV、希腊值）；短 TTL 缓存，并发请求合并回源，大列表自动切块"""
+    codes = list(dict.fromkeys(normalize_symbol(s.strip()) for s in symbols.split(",") if s.strip()))
+    if not codes:
+        raise HTTPException(status_code=400, detail="symbols 参数不能为空")
+    try:
+        rows = await option_snapshot_cache.get(codes, fetch_option_snapshots)
+        return FastJSONResponse({"source": "futu", "data": [rows[c] for c in codes if c in rows]})
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error(f"获取期权快照失败: symbols={codes}, error={e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/realtime-kline")
 async def get_realtime_kline(
     symbol: str = Query(..., description="FutuOpenD 格式，如 US.SPY"),
+    since: int | None = Query(None, description="只返回 timestamp >= since（毫秒）的 K 线"),
+    limit: int | None = Query(None, ge=1, description="最多返回最近 limit 根"),
+    fmt: str | None = Query(None, alias="format", description="响应格式: json(默认), columnar, msgpack"),
+    accept: str | None = Header(None),
 ):
-    """返回订阅缓冲中的实时 1min K 线"""
-    with kline_lock:
-        buf = kline_buffers.get(symbol, deque())
-        data = list(buf)
-    return {
+    """返回订阅缓冲中的实时 1min K 线；stale 为 true 表示推送已停滞（断线或休市），数据可能不是最新"""
+    wire = resolve_format(fmt, accept)
+    subscriptions.touch(symbol)
+    meta = {"source": "futu-realtime", "symbol": to_longport_symbol(symbol), **realtime_staleness(symbol)}
+    if wire == "json":
+        return render_klines(meta, realtime_klines.read(symbol, since, limit), wire)
+    return render_kline_columns(meta, realtime_klines.read_columns(symbol, since, limit), wire)
+
+
+# 支持增量指标的周期（均由推送驱动）
+INDICATOR_KTYPES = ("K_1M", *DERIVED_KTYPES)
+
+
+def _pushed_bars_since(futu_sym: str, ktype: str, since: int) -> list[dict]:
+    """推送缓冲中 timestamp >= since 的 K 线（1min 或派生周期），用于指标预热后接续"""
+    if ktype == "K_1M":
+        return realtime_klines.read(futu_sym, since=since)
+    bars = derived_klines.read(futu_sym, ktype, subscriptions.subscribed_at(futu_sym, "K_1M")) or []
+    return [b for b in bars if b["timestamp"] >= since]
+
+
+async def _indicator_item(futu_sym: str, ktype: str, warmup: bool) -> dict:
+    result = {"symbol": to_longport_symbol(futu_sym)}
+    subscribed_at = subscriptions.subscribed_at(futu_sym, "K_1M")
+    if warmup and indicator_engine.needs_seed(futu_sym, ktype, subscribed_at):
+        try:
+            history = await load_kline(futu_sym, KTYPE_MAP[ktype], ktype, indicator_engine.warmup_bars)
+        except HTTPException as e:
+            return {**result, "status": e.status_code, "error": str(e.detail)}
+        except Exception as e:
+            log.error(f"指标预热失败: symbol={futu_sym}, ktype={ktype}, error={e}")
+            return {**result, "status": 500, "error": str(e)}
+        # 没有推送订阅时指标不会自行更新：与历史 K 线缓存同一收线边界过期，届时重新预热
+        indicator_engine.seed(futu_sym, ktype, history, lambda since: _pushed_bars_since(futu_sym, ktype, since),
+                              kline_cache.expires_at(ktype, time.time()))
+    values = indicator_engine.values(futu_sym, ktype)
+    if values is None:
+        return {**result, "status": 404, "error": "无推送数据，且未预热"}
+    # live: 1min 订阅仍在，指标随推送更新；否则为最近一次预热的历史（每根 K 线收线后重新预热）
+    return {**result, "status": 200, "live": subscribed_at is not None, **values}
+
+
+@app.get("/indicators")
+async def get_indicators(
+    symbols: str = Query(..., description="逗号分隔的 symbol 列表"),
+    ktype: str = Query("K_1M", description=f"K 线周期: {', '.join(INDICATOR_KTYPES)}"),
+    warmup: bool = Query(True, description="首次查询时用历史 K 线预热"),
+):
+    """返回各标的当前指标值（含在途 K 线），由推送增量更新，不回传 K 线"""
+    ktype = ktype.upper()
+    if ktype not in INDICATOR_KTYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的 ktype: {ktype}，支持: {list(INDICATOR_KTYPES)}")
+    futu_symbols = list(dict.fromkeys(_stream_symbols(symbols)))
+    for s in futu_symbols:
+        subscriptions.touch(s)
+    results = await asyncio.gather(*(_indicator_item(s, ktype, warmup) for s in futu_symbols))
+    return FastJSONResponse({
         "source": "futu-realtime",
-        "symbol": to_longport_symbol(symbol),
-        "count": len(data),
-        "data": data,
-    }
+        "ktype": ktype,
+        "indicators": indicator_engine.names,
+        "count": len(results),
+        "errors": sum(1 for r in results if r["status"] != 200),
+        "results": results,
+    })
+
+
+def buffered_bars_since(symbol: str, since: int) -> list[dict]:
+    """订阅缓冲中 timestamp >= since 的 K 线，用于流式连接断线续传"""
+    return realtime_klines.read_since(symbol, since)
+
+
+def _stream_symbols(symbols: str) -> list[str]:
+    futu_symbols = [normalize_symbol(s.strip()) for s in symbols.split(",") if s.strip()]
+    if not futu_symbols:
+        raise HTTPException(status_code=400, detail="symbols 参数不能为空")
+    return futu_symbols
+
+
+def _bar_event(symbol: str, bar: dict) -> dict:
+    return {"type": "bar", "symbol": to_longport_symbol(symbol), "bar": bar}
+
+
+# 流式连接空闲心跳间隔（秒）
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+
+
+@app.get("/stream/kline")
+async def stream_kline(
+    request: Request,
+    symbols: str = Query(..., description="逗号分隔的 symbol 列表，如 US.SPY,US.UUP"),
+    since: int | None = Query(None, description="续传起点毫秒时间戳，先补发缓冲中 >= since 的 K 线"),
+    last_event_id: str | None = Header(None),
+):
+    """SSE 推送实时 1min K 线（新增或更新的 K 线），事件 id 为 K 线 timestamp"""
+    futu_symbols = _stream_symbols(symbols)
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    def sse(symbol: str, bar: dict) -> bytes:
+        return b"event: bar\nid: %d\ndata: %s\n\n" % (bar["timestamp"], dumps(_bar_event(symbol, bar)))
+
+    async def events():
+        sub = kline_stream.subscribe(futu_symbols)
+        try:
+            if since is not None:
+                for sym in futu_symbols:
+                    for bar in buffered_bars_since(sym, since):
+                        yield sse(sym, bar)
+            while not await request.is_disconnected():
+                # 仍有连接在消费，空闲订阅重新计时
+                for sym in futu_symbols:
+                    subscriptions.touch(sym)
+                try:
+                    sym, bar = await asyncio.wait_for(sub.queue.get(), timeout=STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                yield sse(sym, bar)
+        finally:
+            kline_stream.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.websocket("/ws/kline")
+async def ws_kline(
+    websocket: WebSocket,
+    symbols: str = Query(...),
+    since: int | None = Query(None),
+):
+    """WebSocket 推送实时 1min K 线，消息格式同 SSE 的 data；空闲时发 {"type": "ping"}"""
+    try:
+        futu_symbols = _stream_symbols(symbols)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    async def wait_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    await websocket.accept()
+    sub = kline_stream.subscribe(futu_symbols)
+    # 单独监听断开，避免空闲连接要等到下次发送才发现客户端已离开
+    watcher = asyncio.create_task(wait_disconnect())
+    try:
+        if since is not None:
+            for sym in futu_symbols:
+                for bar in buffered_bars_since(sym, since):
+                    await websocket.send_bytes(dumps(_bar_event(sym, bar)))
+        while True:
+            # 仍有连接在消费，空闲订阅重新计时
+            for sym in futu_symbols:
+                subscriptions.touch(sym)
+            getter = asyncio.ensure_future(sub.queue.get())
+            done, _ = await asyncio.wait({getter, watcher}, timeout=STREAM_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if watcher in done:
+                    break
+                await websocket.send_bytes(dumps({"type": "ping"}))
+                continue
+            sym, bar = getter.result()
+            await websocket.send_bytes(dumps(_bar_event(sym, bar)))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        kline_stream.unsubscribe(sub)
+
+
+class SubscriptionRequest(BaseModel):
+    symbols: list[str] = Field(..., min_length=1, description="FutuOpenD 或 LongPort 格式")
+    subtypes: list[str] = Field(["K_1M"], min_length=1, description="订阅类型: K_1M, QUOTE, TICKER 等")
+
+
+@app.get("/subscriptions")
+async def list_subscriptions():
+    """当前订阅（引用计数/空闲时间）及 FutuOpenD 订阅额度"""
+    try:
+        quota = await subscriptions.quota()
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.warning(f"查询订阅额度失败: {e}")
+        quota = None
+    if quota is not None:
+        quota = {k: quota.get(k) for k in ("total_used", "own_used", "remain")}
+    return {"quota": quota, "stats": subscriptions.stats(), "subscriptions": subscriptions.entries()}
+
+
+@app.post("/subscriptions")
+async def acquire_subscriptions(req: SubscriptionRequest):
+    """订阅引用 +1（首次会向 FutuOpenD 订阅）；调用方不再需要时调用 /subscriptions/release"""
+    codes = [normalize_symbol(s) for s in req.symbols]
+    try:
+        return {"subscriptions": await subscriptions.acquire(codes, req.subtypes)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error(f"订阅失败: symbols={codes}, subtypes={req.subtypes}, error={e}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+@app.post("/subscriptions/release")
+async def release_subscriptions(req: SubscriptionRequest):
+    """订阅引用 -1，归零后空闲 SUB_IDLE_TTL 秒自动退订"""
+    codes = [normalize_symbol(s) for s in req.symbols]
+    try:
+        return {"subscriptions": await subscriptions.release(codes, req.subtypes)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 MARKET_MAP = {
@@ -315,6 +1143,32 @@ MARKET_MAP = {
     "HK": TradeDateMarket.HK,
 }
 
+# 交易日历：按 (market, 年份) 整年缓存并落盘
+trading_calendar = TradingCalendar.from_env(kline_disk)
+
+
+def _calendar_args(market: str, *days: str):
+    """校验市场与日期，返回 (市场代码, 整年拉取协程)"""
+    market = market.upper()
+    futu_market = MARKET_MAP.get(market)
+    if futu_market is None:
+        raise HTTPException(status_code=400, detail=f"不支持的市场: {market}，支持: {list(MARKET_MAP.keys())}")
+    for day in days:
+        # 严格按 YYYY-MM-DD 解析：日历以该格式的字符串为键，fromisoformat 会放过 20260401 等写法
+        try:
+            datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"日期格式错误: {day}，应为 YYYY-MM-DD")
+
+    async def fetch(start: str, end: str) -> list[dict]:
+        ret, data = await call_futu("trading_days", "request_trading_days", futu_market, start, end)
+        if ret != RET_OK:
+            raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
+        # request_trading_days 返回 list[dict]，每个元素形如 {'time': '2026-04-01', 'trade_date_type': 'WHOLE'}
+        return data
+
+    return market, fetch
+
 
 @app.get("/trading-days")
 async def get_trading_days(
@@ -322,28 +1176,23 @@ async def get_trading_days(
     start: str = Query(..., description="开始日期 YYYY-MM-DD"),
     end: str = Query(..., description="结束日期 YYYY-MM-DD"),
 ):
-    """获取交易日列表"""
-    futu_market = MARKET_MAP.get(market.upper())
-    if futu_market is None:
-        raise HTTPException(status_code=400, detail=f"不支持的市场: {market}，支持: {list(MARKET_MAP.keys())}")
-
+    """获取交易日列表（整年日历缓存，区间二分切片）"""
+    market, fetch = _calendar_args(market, start, end)
+    if start > end:
+        raise HTTPException(status_code=400, detail=f"开始日期 {start} 晚于结束日期 {end}")
     try:
-        ctx = get_ctx()
-        ret, data = ctx.request_trading_days(futu_market, start, end)
-        if ret != RET_OK:
-            raise HTTPException(status_code=502, detail=f"FutuOpenD 返回错误: {data}")
-
-        # request_trading_days 返回 list[dict]，每个元素形如 {'time': '2026-04-01', 'trade_date_type': 'WHOLE'}
-        trading_days = [d["time"] for d in data]
+        trading_days = await trading_calendar.between(market, start, end, fetch)
         return {
             "source": "futu",
-            "market": market.upper(),
+            "market": market,
             "start": start,
             "end": end,
             "count": len(trading_days),
             "trading_days": trading_days,
         }
 
+    except CalendarRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -351,6 +1200,59 @@ async def get_trading_days(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/trading-days/is-trading-day")
+async def is_trading_day(
+    market: str = Query("US", description="市场: US, HK"),
+    day: str = Query(..., alias="date", description="日期 YYYY-MM-DD"),
+):
+    """是否交易日；type 为 WHOLE（全天）/ MORNING / AFTERNOON（半日市），非交易日为 null"""
+    market, fetch = _calendar_args(market, day)
+    try:
+        day_type = await trading_calendar.info(market, day, fetch)
+        return {"market": market, "date": day, "is_trading_day": day_type is not None, "type": day_type}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error(f"查询交易日失败: market={market}, date={day}, error={e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _trading_day_offset(market: str, day: str, n: int) -> dict:
+    market, fetch = _calendar_args(market, day)
+    try:
+        result = await trading_calendar.offset(market, day, n, fetch)
+        return {"market": market, "date": day, "n": abs(n), "result": result}
+
+    except CalendarRangeError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error(f"查询前后交易日失败: market={market}, date={day}, n={n}, error={e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/trading-days/next")
+async def next_trading_day(
+    market: str = Query("US", description="市场: US, HK"),
+    day: str = Query(..., alias="date", description="日期 YYYY-MM-DD"),
+    n: int = Query(1, ge=1, le=1000, description="之后第 n 个交易日（不含 date 本身）"),
+):
+    """date 之后第 n 个交易日"""
+    return await _trading_day_offset(market, day, n)
+
+
+@app.get("/trading-days/previous")
+async def previous_trading_day(
+    market: str = Query("US", description="市场: US, HK"),
+    day: str = Query(..., alias="date", description="日期 YYYY-MM-DD"),
+    n: int = Query(1, ge=1, le=1000, description="之前第 n 个交易日（不含 date 本身），即往前数 n 个交易日"),
+):
+    """date 之前第 n 个交易日"""
+    return await _trading_day_offset(market, day, -n)
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("BRIDGE_PORT", "8765"))
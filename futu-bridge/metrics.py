@@ -0,0 +1,179 @@
+"""
+Prometheus 文本格式指标
+不依赖 prometheus_client：计数器与直方图都是事件循环线程内的普通 dict / list，
+每次观测一次 bisect + 两次加法，常开的开销可以忽略。
+- MetricsMiddleware：按路由模板（如 /kline）统计请求数与总耗时，
+  并把本请求内 FutuOpenD 调用耗时（call_futu）与响应编码耗时（FastJSONResponse / msgpack）分别计入直方图
+- 其余运行状态（缓冲深度、缓存命中、推送量、限流排队等）由 /metrics 路由从各组件的 stats() 现场生成
+请求内的分段耗时经 contextvar 传递；在独立任务中执行的回源（如合并的快照回源）计入发起该任务的请求。
+"""
+
+import bisect
+import time
+from contextvars import ContextVar
+
+# 秒
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        # 最后一格为 +Inf
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestTiming:
+    """单个请求内的分段耗时（秒）"""
+    __slots__ = ("upstream", "serialize")
+
+    def __init__(self):
+        self.upstream = 0.0
+        self.serialize = 0.0
+
+
+current_timing: ContextVar[RequestTiming | None] = ContextVar("current_timing", default=None)
+
+
+def add_upstream(seconds: float):
+    timing = current_timing.get()
+    if timing is not None:
+        timing.upstream += seconds
+
+
+def add_serialize(seconds: float):
+    timing = current_timing.get()
+    if timing is not None:
+        timing.serialize += seconds
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.requests: dict[tuple[str, str, int], int] = {}
+        # (route, phase) → 直方图，phase 为 total / upstream / serialize
+        self.durations: dict[tuple[str, str], Histogram] = {}
+        self.futu_calls: dict[str, Histogram] = {}
+        self.rate_waits: dict[tuple[str, str], Histogram] = {}
+
+    def _hist(self, table: dict, key) -> Histogram:
+        h = table.get(key)
+        if h is None:
+            h = table[key] = Histogram()
+        return h
+
+    def observe_request(self, route: str, method: str, status: int, total: float | None, timing: RequestTiming):
+        key = (route, method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        if total is None:
+            # 流式响应的持续时间不是延迟，不计入直方图
+            return
+        self._hist(self.durations, (route, "total")).observe(total)
+        self._hist(self.durations, (route, "upstream")).observe(timing.upstream)
+        self._hist(self.durations, (route, "serialize")).observe(timing.serialize)
+
+    def observe_futu_call(self, endpoint: str, seconds: float):
+        self._hist(self.futu_calls, endpoint).observe(seconds)
+
+    def observe_rate_wait(self, family: str, lane: str, seconds: float):
+        self._hist(self.rate_waits, (family, lane)).observe(seconds)
+
+    @staticmethod
+    def _render_hist(out: list[str], name: str, labels: dict, h: Histogram):
+        cumulative = 0
+        for bound, n in zip(BUCKETS, h.counts):
+            cumulative += n
+            out.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+        out.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {h.count}")
+        out.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+        out.append(f"{name}_count{_labels(labels)} {h.count}")
+
+    def render(self, families: list[tuple[str, str, str, list[tuple[dict, float]]]]) -> str:
+        """
+        输出全部指标；families 为路由现场生成的 (name, type, help, [(labels, value)])，
+        type 为 counter / gauge
+        """
+        out: list[str] = []
+        out.append("# HELP futu_bridge_http_requests_total HTTP 请求数")
+        out.append("# TYPE futu_bridge_http_requests_total counter")
+        for (route, method, status), n in sorted(self.requests.items()):
+            out.append(f"futu_bridge_http_requests_total{_labels({'route': route, 'method': method, 'status': status})} {n}")
+
+        out.append("# HELP futu_bridge_http_request_duration_seconds 请求耗时，phase: total / upstream（FutuOpenD 调用）/ serialize（响应编码）")
+        out.append("# TYPE futu_bridge_http_request_duration_seconds histogram")
+        for (route, phase), h in sorted(self.durations.items()):
+            self._render_hist(out, "futu_bridge_http_request_duration_seconds", {"route": route, "phase": phase}, h)
+
+        out.append("# HELP futu_bridge_futu_call_duration_seconds 单次 FutuOpenD 调用耗时（含执行层排队）")
+        out.append("# TYPE futu_bridge_futu_call_duration_seconds histogram")
+        for endpoint, h in sorted(self.futu_calls.items()):
+            self._render_hist(out, "futu_bridge_futu_call_duration_seconds", {"endpoint": endpoint}, h)
+
+        out.append("# HELP futu_bridge_rate_limit_wait_seconds 等待频率令牌的耗时")
+        out.append("# TYPE futu_bridge_rate_limit_wait_seconds histogram")
+        for (family, lane), h in sorted(self.rate_waits.items()):
+            self._render_hist(out, "futu_bridge_rate_limit_wait_seconds", {"family": family, "lane": lane}, h)
+
+        for name, kind, help_text, samples in families:
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                out.append(f"{name}{_labels(labels)} {value}")
+        out.append("")
+        return "\n".join(out)
+
+
+class MetricsMiddleware:
+    """按路由模板记录请求数与耗时；未匹配路由统一记为 unmatched，避免标签基数失控"""
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        t0 = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def _send(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for k, v in message.get("headers", ()):
+                    if k == b"content-type" and v.startswith(b"text/event-stream"):
+                        streaming = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            current_timing.reset(token)
+            route = scope.get("route")
+            self.registry.observe_request(
+                route.path if route is not None else "unmatched",
+                scope["method"],
+                status,
+                None if streaming else time.perf_counter() - t0,
+                timing,
+            )
@@ -0,0 +1,118 @@
+"""
+期权链缓存
+- 到期日列表：按标的缓存 expiry_ttl 秒（一天内基本不变）；只缓存日期，距到期天数在响应时按标的市场当地日期计算
+- 期权链：按 (标的, 到期日) 缓存 ttl 秒，盘中新增行权价最多延迟 ttl 秒可见
+并发请求同一键时共享一次回源；回源在独立任务中执行，发起请求的连接断开不会取消其他请求等待的调用。
+合约行情（快照）不在这里缓存，由路由层经 SnapshotCache 批量拉取。
+仅在事件循环线程内访问，无需加锁。
+"""
+
+import asyncio
+import bisect
+import os
+import time
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+# 标的市场前缀 → 交易所时区，用于判断到期日是否已过
+MARKET_TZ = {
+    "US": ZoneInfo("America/New_York"),
+    "HK": ZoneInfo("Asia/Hong_Kong"),
+    "SH": ZoneInfo("Asia/Shanghai"),
+    "SZ": ZoneInfo("Asia/Shanghai"),
+}
+
+
+class OptionChainCache:
+    def __init__(self, ttl: float, expiry_ttl: float):
+        self.ttl = ttl
+        self.expiry_ttl = expiry_ttl
+        # 键 → (值, 拉取时间)
+        self._expirations: dict[str, tuple[list[dict], float]] = {}
+        self._chains: dict[tuple[str, str], tuple[list[dict], float]] = {}
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+
+    @classmethod
+    def from_env(cls) -> "OptionChainCache":
+        """
+        OPTION_CHAIN_TTL: 单个到期日期权链的缓存秒数
+        OPTION_EXPIRY_TTL: 到期日列表的缓存秒数
+        """
+        return cls(
+            ttl=float(os.getenv("OPTION_CHAIN_TTL", "60")),
+            expiry_ttl=float(os.getenv("OPTION_EXPIRY_TTL", "3600")),
+        )
+
+    async def _cached(self, table: dict, key, ttl: float, fetch):
+        cached = table.get(key)
+        if cached is not None and time.time() - cached[1] < ttl:
+            self.hits += 1
+            return cached[0]
+        flight = (id(table), key)
+        task = self._inflight.get(flight)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            self.upstream_calls += 1
+            task = asyncio.create_task(fetch())
+            self._inflight[flight] = task
+
+            def _done(t: asyncio.Task):
+                self._inflight.pop(flight, None)
+                if not t.cancelled() and t.exception() is None:
+                    table[key] = (t.result(), time.time())
+
+            task.add_done_callback(_done)
+        # shield：等待方被取消时不取消共享的回源
+        return await asyncio.shield(task)
+
+    async def expirations(self, code: str, fetch) -> list[dict]:
+        """
+        fetch() 为协程，返回按日期升序的到期日 ["YYYY-MM-DD"]
+        """
+        return await self._cached(self._expirations, code, self.expiry_ttl, fetch)
+
+    async def chain(self, code: str, expiry: str, fetch) -> list[dict]:
+        """
+        fetch() 为协程，返回该到期日的全部合约 [{"code", "strike", "type", ...}]，按行权价升序
+        """
+        return await self._cached(self._chains, (code, expiry), self.ttl, fetch)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "expirations": len(self._expirations),
+            "chains": len(self._chains),
+            "ttl": self.ttl,
+            "expiry_ttl": self.expiry_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "inflight": len(self._inflight),
+            "upstream_calls": self.upstream_calls,
+        }
+
+
+def market_today(code: str) -> date:
+    """标的所在市场的当地日期（US.SPY → 纽约当日）"""
+    return datetime.now(MARKET_TZ.get(code.split(".", 1)[0], MARKET_TZ["US"])).date()
+
+
+def days_to_expiry(expiry: str, today: date) -> int:
+    """距到期日天数，0 即当日到期，负数为已过期"""
+    return (datetime.strptime(expiry, "%Y-%m-%d").date() - today).days
+
+
+def strikes_near(strikes: list[float], price: float, n: int) -> tuple[float, float]:
+    """升序行权价中离 price 最近的一档上下各取 n 档，返回 (最低, 最高) 行权价"""
+    i = bisect.bisect_left(strikes, price)
+    # 取离 price 更近的一档作为平值
+    if i == len(strikes) or (i > 0 and price - strikes[i - 1] <= strikes[i] - price):
+        i -= 1
+    return strikes[max(i - n, 0)], strikes[min(i + n, len(strikes) - 1)]
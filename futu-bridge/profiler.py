@@ -0,0 +1,243 @@
+"""
+请求级分段耗时剖析（按需开启）
+- 请求带 X-Profile: 1 时必定剖析该请求，并在响应头 Server-Timing 中给出顶层分段耗时
+- 通过 POST /profile 开启后按 sample_rate 抽样剖析其余请求
+热路径用 phase("名称") 包裹各阶段（取令牌、request_history_kline、frame_to_klines、编码等），
+分段可嵌套，路径经 contextvar 传递，gather 出的并发子任务各自记录自己的路径。
+未剖析的请求 phase() 只做一次 contextvar 读取。
+保留最近 window 秒内最慢的 keep 条记录，可导出为 JSON 或火焰图工具使用的 folded stacks。
+仅在事件循环线程内访问，无需加锁。
+"""
+
+import itertools
+import os
+import random
+import time
+from contextvars import ContextVar
+
+PROFILE_HEADER = b"x-profile"
+
+
+class Trace:
+    __slots__ = ("id", "route", "method", "path", "start", "started_at", "total", "status", "spans")
+
+    def __init__(self, trace_id: int, method: str, path: str):
+        self.id = trace_id
+        self.route = path
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.total = 0.0
+        self.status = 0
+        # (分段路径, 相对请求开始的偏移, 耗时)，单位秒
+        self.spans: list[tuple[tuple[str, ...], float, float]] = []
+
+    def top_level(self) -> dict[str, float]:
+        """顶层分段耗时合计（同名分段多次出现时累加）"""
+        totals: dict[str, float] = {}
+        for path, _, dur in self.spans:
+            if len(path) == 1:
+                totals[path[0]] = totals.get(path[0], 0.0) + dur
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": self.status,
+            "started_at": int(self.started_at * 1000),
+            "total_ms": round(self.total * 1000, 3),
+            "phases": [
+                {"phase": "/".join(path), "offset_ms": round(offset * 1000, 3), "ms": round(dur * 1000, 3)}
+                for path, offset, dur in sorted(self.spans, key=lambda s: s[1])
+            ],
+        }
+
+
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_path: ContextVar[tuple[str, ...]] = ContextVar("current_path", default=())
+
+
+class _Phase:
+    __slots__ = ("trace", "name", "token", "t0")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.token = _current_path.set(_current_path.get() + (self.name,))
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter()
+        path = _current_path.get()
+        _current_path.reset(self.token)
+        self.trace.spans.append((path, self.t0 - self.trace.start, t1 - self.t0))
+        return False
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str):
+    """with phase("frame_to_klines"): ...  —— 当前请求未被剖析时为空操作"""
+    trace = current_trace.get()
+    if trace is None:
+        return _NO_PHASE
+    return _Phase(trace, name)
+
+
+def _fold(frame: str) -> str:
+    # folded stacks 以 ; 分隔帧、以空格分隔数值
+    return frame.replace(";", ":").replace(" ", "_")
+
+
+class Profiler:
+    def __init__(self, enabled: bool, sample_rate: float, keep: int, window: float):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.window = window
+        self._traces: list[Trace] = []
+        self._ids = itertools.count(1)
+        self.sampled = 0
+        self.forced = 0
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        """
+        PROFILE_ENABLED: 启动时是否开启抽样剖析（也可运行时经 POST /profile 切换）
+        PROFILE_SAMPLE_RATE: 开启后被剖析的请求比例（0~1）
+        PROFILE_KEEP: 保留最慢的记录条数
+        PROFILE_WINDOW: 只保留最近多少秒内的记录
+        """
+        return cls(
+            enabled=os.getenv("PROFILE_ENABLED", "0").lower() in ("1", "true", "yes"),
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0.1")),
+            keep=int(os.getenv("PROFILE_KEEP", "50")),
+            window=float(os.getenv("PROFILE_WINDOW", "600")),
+        )
+
+    def configure(self, enabled: bool | None = None, sample_rate: float | None = None, clear: bool = False):
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if clear:
+            self._traces.clear()
+
+    def start(self, method: str, path: str, forced: bool) -> Trace | None:
+        if forced:
+            self.forced += 1
+        elif not (self.enabled and random.random() < self.sample_rate):
+            return None
+        else:
+            self.sampled += 1
+        return Trace(next(self._ids), method, path)
+
+    def finish(self, trace: Trace):
+        trace.total = time.perf_counter() - trace.start
+        self._expire(time.time())
+        self._traces.append(trace)
+        if len(self._traces) > self.keep:
+            self._traces.remove(min(self._traces, key=lambda t: t.total))
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        if self._traces and min(t.started_at for t in self._traces) < cutoff:
+            self._traces = [t for t in self._traces if t.started_at >= cutoff]
+
+    def traces(self) -> list[Trace]:
+        """窗口内的记录，最慢的在前"""
+        self._expire(time.time())
+        return sorted(self._traces, key=lambda t: t.total, reverse=True)
+
+    def folded(self) -> str:
+        """
+        所有记录按 folded stacks 合并输出（每行 "帧;帧;帧 微秒"），可直接交给 flamegraph.pl / speedscope。
+        每帧的值为自身耗时（扣除子分段），根帧为 "METHOD 路由"；
+        并发子分段之和可能超过父分段，自身耗时按 0 计
+        """
+        stacks: dict[str, float] = {}
+        for trace in self.traces():
+            root = _fold(f"{trace.method} {trace.route}")
+            child_sum: dict[tuple[str, ...], float] = {}
+            own: dict[tuple[str, ...], float] = {(): trace.total}
+            for path, _, dur in trace.spans:
+                own[path] = own.get(path, 0.0) + dur
+                child_sum[path[:-1]] = child_sum.get(path[:-1], 0.0) + dur
+            for path, dur in own.items():
+                self_time = max(dur - child_sum.get(path, 0.0), 0.0)
+                key = ";".join([root, *(_fold(p) for p in path)])
+                stacks[key] = stacks.get(key, 0.0) + self_time
+        return "".join(f"{k} {round(v * 1e6)}\n" for k, v in sorted(stacks.items()) if v > 0)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "keep": self.keep,
+            "window_s": self.window,
+            "sampled": self.sampled,
+            "forced": self.forced,
+            "traces": len(self._traces),
+        }
+
+
+class ProfilingMiddleware:
+    """为抽样中或带 X-Profile 头的请求建立 Trace，请求结束后交给 Profiler 保存"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        forced = False
+        for k, v in scope["headers"]:
+            if k == PROFILE_HEADER:
+                forced = v.strip().lower() in (b"1", b"true", b"yes")
+                break
+        trace = self.profiler.start(scope["method"], scope["path"], forced)
+        if trace is None:
+            return await self.app(scope, receive, send)
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                if forced:
+                    timing = ", ".join(
+                        f"{_fold(name)};dur={dur * 1000:.3f}" for name, dur in trace.top_level().items()
+                    )
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"x-profile-id", str(trace.id).encode()))
+                    if timing:
+                        headers.append((b"server-timing", timing.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_trace.set(trace)
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            current_trace.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                trace.route = route.path
+            self.profiler.finish(trace)
@@ -0,0 +1,169 @@
+"""
+FutuOpenD 行情连接池
+多个 OpenQuoteContext（各自一条 TCP 连接），请求按最少在途调用数分派到健康的连接上，
+历史 K 线、快照等相互独立的请求不再挤在同一条连接上排队。
+订阅与推送只能绑定在一条连接上：0 号连接为主连接，订阅类调用固定走它，推送处理器也注册在它上面。
+健康判定：连接状态不是 READY（futu-api 正在自动重连）或连续失败达到阈值后冷却一段时间，期间不分派请求；
+全部不健康时仍按最少在途分派，由 FutuOpenD 返回错误。
+连接在首次使用时建立。分派与计数只在事件循环线程内进行，建立连接在执行层线程中（按连接加锁）。
+"""
+
+import logging
+import os
+import threading
+import time
+
+from futu import RET_OK
+from futu.common.constant import ContextStatus
+
+log = logging.getLogger("futu-bridge")
+
+
+class _Slot:
+    __slots__ = ("index", "ctx", "lock", "inflight", "calls", "errors", "failures", "down_until", "last_error")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.ctx = None
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.calls = 0
+        self.errors = 0
+        # 连续失败次数，成功一次清零
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error: str | None = None
+
+    def status(self) -> str:
+        return self.ctx.status if self.ctx is not None else "IDLE"
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until and (self.ctx is None or self.ctx.status == ContextStatus.READY)
+
+
+class QuotePool:
+    def __init__(self, factory, size: int, fail_threshold: int, cooldown: float):
+        """factory() 新建一个 OpenQuoteContext（阻塞，连接 FutuOpenD）"""
+        self._factory = factory
+        self.fail_threshold = fail_threshold
+        self.cooldown = cooldown
+        self._slots = [_Slot(i) for i in range(max(size, 1))]
+
+    @classmethod
+    def from_env(cls, factory) -> "QuotePool":
+        """
+        FUTU_POOL_SIZE: 行情连接数（含主连接）
+        FUTU_POOL_FAIL_THRESHOLD: 连续失败多少次后暂停分派
+        FUTU_POOL_COOLDOWN: 暂停分派的秒数
+        """
+        return cls(
+            factory,
+            size=int(os.getenv("FUTU_POOL_SIZE", "2")),
+            fail_threshold=int(os.getenv("FUTU_POOL_FAIL_THRESHOLD", "3")),
+            cooldown=float(os.getenv("FUTU_POOL_COOLDOWN", "10")),
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self._slots)
+
+    def _ctx(self, slot: _Slot):
+        if slot.ctx is None:
+            with slot.lock:
+                if slot.ctx is None:
+                    log.info(f"建立 FutuOpenD 行情连接 #{slot.index}")
+                    slot.ctx = self._factory()
+        return slot.ctx
+
+    def primary(self):
+        """主连接：订阅、推送处理器、全局状态查询"""
+        return self._ctx(self._slots[0])
+
+    def pick(self, primary: bool = False) -> _Slot:
+        """选一条连接并占用（在途 +1），调用结束后必须 release"""
+        if primary:
+            slot = self._slots[0]
+        else:
+            now = time.monotonic()
+            candidates = [s for s in self._slots if s.healthy(now)] or self._slots
+            slot = min(candidates, key=lambda s: (s.inflight, s.calls))
+        slot.inflight += 1
+        return slot
+
+    def call(self, slot: _Slot, method: str, *args, **kwargs):
+        """在执行层线程中调用 slot 连接上的 method"""
+        return getattr(self._ctx(slot), method)(*args, **kwargs)
+
+    def release(self, slot: _Slot, result=None, error: BaseException | None = None):
+        """
+        归还连接并记录结果：抛异常、或返回 RET_ERROR 且连接已不在 READY 状态算一次失败；
+        RET_ERROR 但连接正常（参数错误、额度不足等）不影响健康度
+        """
+        slot.inflight -= 1
+        slot.calls += 1
+        failed = error is not None
+        if not failed and isinstance(result, tuple) and result and result[0] != RET_OK:
+            slot.errors += 1
+            failed = slot.ctx is not None and slot.ctx.status != ContextStatus.READY
+            if failed:
+                slot.last_error = str(result[1])
+        if error is not None:
+            slot.errors += 1
+            slot.last_error = str(error)
+        if not failed:
+            slot.failures = 0
+            return
+        slot.failures += 1
+        if slot.failures >= self.fail_threshold:
+            slot.down_until = time.monotonic() + self.cooldown
+            slot.failures = 0
+            log.warning(f"FutuOpenD 行情连接 #{slot.index} 连续失败，暂停分派 {self.cooldown:g}s: {slot.last_error}")
+
+    def abandon(self, slot: _Slot):
+        """归还连接，不计结果"""
+        slot.inflight -= 1
+
+    def settle(self, slot: _Slot, fut):
+        """
+        作为执行层 Future 的完成回调：线程上的调用真正结束后才归还连接；
+        调用方中途断开不影响在途计数
+        """
+        if fut.cancelled():
+            self.abandon(slot)
+        elif fut.exception() is not None:
+            self.release(slot, error=fut.exception())
+        else:
+            self.release(slot, fut.result())
+
+    def contexts(self) -> list:
+        """已建立的连接"""
+        return [s.ctx for s in self._slots if s.ctx is not None]
+
+    def connections(self) -> list[tuple[int, object]]:
+        """已建立的 (编号, 连接)，0 号为主连接"""
+        return [(s.index, s.ctx) for s in self._slots if s.ctx is not None]
+
+    def close(self):
+        for slot in self._slots:
+            if slot.ctx is not None:
+                slot.ctx.close()
+                slot.ctx = None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "size": self.size,
+            "connections": [
+                {
+                    "index": s.index,
+                    "status": s.status(),
+                    "healthy": s.healthy(now),
+                    "inflight": s.inflight,
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "cooldown_s": round(max(s.down_until - now, 0.0), 3),
+                    "last_error": s.last_error,
+                }
+                for s in self._slots
+            ],
+        }
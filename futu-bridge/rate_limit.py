@@ -0,0 +1,248 @@
+"""
+FutuOpenD 接口频率调度（客户端侧）
+FutuOpenD 按接口族限制请求频率（如历史 K 线、快照每 30 秒最多 60 次），超出直接返回错误。
+每个接口族一个令牌桶，调用前取令牌；令牌不足时按优先级通道排队：
+- critical：下单/风控等关键路径
+- normal：默认
+- background：K 线采集等后台任务，只有前两条通道空闲时才放行
+排队有上限，每个请求有截止时间：预计等待超过截止时间的直接拒绝，排队中到期的也拒绝（路由层转为 429）。
+令牌桶按 burst + rate × window ≤ FutuOpenD 限额取值，任意窗口内都不会超限。
+仅在事件循环线程内访问，无需加锁。
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+
+LANES = ("critical", "normal", "background")
+
+# 当前请求的优先级通道与截止时间（秒），由 PriorityLaneMiddleware 按请求头设置
+current_lane: ContextVar[str] = ContextVar("current_lane", default="normal")
+current_deadline: ContextVar[float | None] = ContextVar("current_deadline", default=None)
+
+
+class RateLimitedError(RuntimeError):
+    """频率额度不足且在截止时间内等不到令牌（路由层转为 429）"""
+
+
+class _LaneStats:
+    __slots__ = ("granted", "delayed", "rejected", "expired", "wait_ms_total", "max_wait_ms")
+
+    def __init__(self):
+        self.granted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.wait_ms_total = 0.0
+        self.max_wait_ms = 0.0
+
+    def grant(self, wait: float):
+        self.granted += 1
+        if wait > 0:
+            self.delayed += 1
+            self.wait_ms_total += wait * 1000
+            self.max_wait_ms = max(self.max_wait_ms, wait * 1000)
+
+
+class TokenBucket:
+    """单个接口族的令牌桶 + 优先级排队"""
+
+    def __init__(self, name: str, rate: float, burst: float, queue_max: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.queue_max = queue_max
+        self.tokens = burst
+        self._updated = time.monotonic()
+        self._queues: dict[str, deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self._pump: asyncio.Task | None = None
+        self._stats = {lane: _LaneStats() for lane in LANES}
+        self.refunded = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _queued(self, lanes=LANES) -> int:
+        return sum(1 for lane in lanes for fut in self._queues[lane] if not fut.done())
+
+    async def acquire(self, lane: str, max_wait: float):
+        now = time.monotonic()
+        self._refill(now)
+        stats = self._stats[lane]
+        # 同级及更高优先级已排队的请求先走
+        ahead = self._queued(LANES[:LANES.index(lane) + 1])
+        if ahead == 0 and self.tokens >= 1:
+            self.tokens -= 1
+            stats.grant(0.0)
+            return
+
+        if self._queued() >= self.queue_max:
+            stats.rejected += 1
+            raise RateLimitedError(f"{self.name} 排队已满 ({self.queue_max})")
+        est = (ahead + 1 - self.tokens) / self.rate
+        if est > max_wait:
+            stats.rejected += 1
+            raise RateLimitedError(f"{self.name} 频率额度不足，预计等待 {est:.1f}s 超过 {max_wait:g}s")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[lane].append(fut)
+        if self._pump is None:
+            self._pump = asyncio.create_task(self._run_pump())
+        try:
+            await asyncio.wait_for(fut, max_wait)
+        except asyncio.TimeoutError:
+            stats.expired += 1
+            raise RateLimitedError(f"{self.name} 排队超过截止时间 {max_wait:g}s")
+        stats.grant(time.monotonic() - now)
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue:
+                fut = queue.popleft()
+                if not fut.done():
+                    return fut
+        return None
+
+    async def _run_pump(self):
+        """按优先级把令牌发给排队的请求，没有排队时退出"""
+        try:
+            while self._queued():
+                self._refill(time.monotonic())
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    continue
+                fut = self._next_waiter()
+                if fut is not None:
+                    self.tokens -= 1
+                    fut.set_result(None)
+        finally:
+            self._pump = None
+
+    def refund(self):
+        """退还一个已发放但没有用于 FutuOpenD 调用的令牌"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.burst, self.tokens + 1)
+        self.refunded += 1
+
+    def stats(self) -> dict:
+        self._refill(time.monotonic())
+        lanes = {}
+        for lane, s in self._stats.items():
+            lanes[lane] = {
+                "queued": self._queued((lane,)),
+                "granted": s.granted,
+                "delayed": s.delayed,
+                "rejected": s.rejected,
+                "expired": s.expired,
+                "avg_wait_ms": round(s.wait_ms_total / max(s.granted, 1), 3),
+                "max_wait_ms": round(s.max_wait_ms, 3),
+            }
+        return {
+            "rate": round(self.rate, 4),
+            "burst": self.burst,
+            "tokens": round(self.tokens, 3),
+            "queue_max": self.queue_max,
+            "refunded": self.refunded,
+            "lanes": lanes,
+        }
+
+
+def _parse_quota(value: str) -> tuple[int, float] | None:
+    """"60/30" → (60, 30.0)；"0" 或空为不限"""
+    if not value or value == "0":
+        return None
+    calls, window = value.split("/")
+    return int(calls), float(window)
+
+
+class RateScheduler:
+    def __init__(self, buckets: dict[str, TokenBucket], lane_wait: dict[str, float]):
+        self._buckets = buckets
+        self.lane_wait = lane_wait
+
+    @classmethod
+    def from_env(cls) -> "RateScheduler":
+        """
+        FUTU_RATE_<FAMILY>: FutuOpenD 限额 "次数/秒数"，如 FUTU_RATE_KLINE=60/30；0 为不限。
+            令牌桶取 burst = 限额 / 3，rate = 限额 × 2/3 / 窗口，任意窗口内调用数不超过限额
+        FUTU_RATE_QUEUE_MAX: 每个接口族最多排队的请求数
+        FUTU_LANE_WAIT_<LANE>: 各通道默认最长等待秒数（请求头 X-Deadline-Ms 可缩短）
+        """
+        defaults = {
+            "kline": "60/30", "snapshot": "60/30", "trading_days": "30/30", "subscribe": "60/30",
+            "option_expiry": "60/30", "option_chain": "10/30",
+        }
+        queue_max = int(os.getenv("FUTU_RATE_QUEUE_MAX", "100"))
+        buckets = {}
+        for family, default in defaults.items():
+            quota = _parse_quota(os.getenv(f"FUTU_RATE_{family.upper()}", default))
+            if quota is None:
+                continue
+            calls, window = quota
+            buckets[family] = TokenBucket(family, rate=calls * 2 / 3 / window, burst=max(calls // 3, 1),
+                                          queue_max=queue_max)
+        lane_wait = {
+            "critical": float(os.getenv("FUTU_LANE_WAIT_CRITICAL", "5")),
+            "normal": float(os.getenv("FUTU_LANE_WAIT_NORMAL", "10")),
+            "background": float(os.getenv("FUTU_LANE_WAIT_BACKGROUND", "60")),
+        }
+        return cls(buckets, lane_wait)
+
+    async def acquire(self, family: str):
+        """按当前请求的通道与截止时间取一个 family 令牌；未配置限额的接口族直接放行"""
+        bucket = self._buckets.get(family)
+        if bucket is None:
+            return
+        lane = current_lane.get()
+        max_wait = self.lane_wait[lane]
+        deadline = current_deadline.get()
+        if deadline is not None:
+            max_wait = min(max_wait, max(deadline - time.monotonic(), 0.0))
+        await bucket.acquire(lane, max_wait)
+
+    def refund(self, family: str):
+        """取到令牌后调用没有发出（如执行层排队已满）时退还，避免被拒绝的请求消耗 FutuOpenD 额度"""
+        bucket = self._buckets.get(family)
+        if bucket is not None:
+            bucket.refund()
+
+    def stats(self) -> dict:
+        return {
+            "lane_wait": self.lane_wait,
+            "families": {name: b.stats() for name, b in self._buckets.items()},
+        }
+
+
+class PriorityLaneMiddleware:
+    """
+    按请求头设置优先级通道与截止时间：
+    X-Priority: critical / normal / background（缺省或无法识别为 normal）
+    X-Deadline-Ms: 本请求愿意为频率额度等待的最长毫秒数
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        lane = headers.get(b"x-priority", b"normal").decode("latin-1").lower()
+        lane_token = current_lane.set(lane if lane in LANES else "normal")
+        deadline = None
+        raw = headers.get(b"x-deadline-ms")
+        if raw is not None:
+            try:
+                deadline = time.monotonic() + max(float(raw), 0.0) / 1000
+            except ValueError:
+                pass
+        deadline_token = current_deadline.set(deadline)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_deadline.reset(deadline_token)
+            current_lane.reset(lane_token)
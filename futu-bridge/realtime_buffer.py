@@ -0,0 +1,239 @@
+"""
+实时 1min K 线缓冲
+FutuOpenD 推送的 DataFrame 整块转换后一次加锁写入所有标的；
+同一 time_key 的 K 线（未收线时的多次推送）原地覆盖，不追加重复行。
+每个标的一个预分配的 KlineRing，深度可配置，读取时从连续视图直接转换输出。
+写入按标的加锁；读取不加锁，按版本号复制窗口后在锁外转换，HTTP 读取不会阻塞 FutuOpenD 回调线程。
+大块推送走列式转换；常见的单行推送 pandas 列操作的固定开销反而更高，
+改为一次 values.tolist() + 缓存的 time_key 解析。
+"""
+
+import functools
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from futu import SubType
+
+from kline_format import KLINE_FIELDS, frame_to_columns, columns_to_klines
+from ring_buffer import BAR_DTYPE, KlineRing, view_to_columns, view_to_klines
+
+# 行数达到该值才走列式转换
+COLUMNAR_MIN_ROWS = 64
+
+EMPTY_VIEW = np.zeros(0, dtype=BAR_DTYPE)
+
+
+@functools.lru_cache(maxsize=4096)
+def _time_key_ms(time_key: str) -> int:
+    """与 kline_format.time_key_to_ms 相同语义的单值版本，未收线 K 线会以同一 time_key 反复推送"""
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return int(datetime.strptime(time_key, fmt).timestamp() * 1000)
+        except ValueError:
+            continue
+    return 0
+
+
+def _small_frame_bars(data: pd.DataFrame) -> tuple[list[str], list[dict]]:
+    names = list(data.columns)
+    pos = {n: i for i, n in enumerate(names)}
+    i_code, i_type, i_tk = pos.get("code"), pos.get("k_type"), pos.get("time_key")
+    i_open, i_high, i_low, i_close = pos.get("open"), pos.get("high"), pos.get("low"), pos.get("close")
+    i_vol, i_turn = pos.get("volume"), pos.get("turnover")
+    codes, bars = [], []
+    for row in data.values.tolist():
+        if i_type is not None and row[i_type] != SubType.K_1M:
+            continue
+        tk = row[i_tk] if i_tk is not None else None
+        codes.append(row[i_code] if i_code is not None else "")
+        bars.append(dict(zip(KLINE_FIELDS, (
+            _time_key_ms(tk) if isinstance(tk, str) and tk else 0,
+            float(row[i_open]) if i_open is not None else 0.0,
+            float(row[i_high]) if i_high is not None else 0.0,
+            float(row[i_low]) if i_low is not None else 0.0,
+            float(row[i_close]) if i_close is not None else 0.0,
+            int(row[i_vol]) if i_vol is not None else 0,
+            float(row[i_turn]) if i_turn is not None else 0.0,
+        ))))
+    return codes, bars
+
+
+def _large_frame_bars(data: pd.DataFrame) -> tuple[list[str], list[dict]]:
+    if "k_type" in data.columns:
+        data = data[data["k_type"] == SubType.K_1M]
+    if data.empty:
+        return [], []
+    bars = columns_to_klines(frame_to_columns(data))
+    codes = data["code"].tolist() if "code" in data.columns else [""] * len(bars)
+    return codes, bars
+
+
+class _Series:
+    """单个标的：环形缓冲 + 写入锁（只在写入方之间互斥，读取方不获取）"""
+    __slots__ = ("ring", "lock")
+
+    def __init__(self, capacity: int):
+        self.ring = KlineRing(capacity)
+        self.lock = threading.Lock()
+
+
+class RealtimeKlines:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._series: dict[str, _Series] = {}
+        # 只保护标的注册与统计计数，不在读取路径上
+        self._lock = threading.Lock()
+        self.pushes = 0
+        self.bars_in = 0
+        self.appended = 0
+        self.updated = 0
+        self.stale = 0
+        self.reads = 0
+        self.read_fallbacks = 0
+        self.backfilled = 0
+        # 各标的最近一次收到推送的时间（秒），用于判断推送是否停滞
+        self._last_push: dict[str, float] = {}
+        # 各标的累计推送 K 线根数（/metrics 按标的输出计数器，rate() 即每秒推送量）
+        self._push_bars: dict[str, int] = {}
+
+    def _get_series(self, code: str) -> _Series:
+        series = self._series.get(code)
+        if series is None:
+            with self._lock:
+                series = self._series.get(code)
+                if series is None:
+                    series = self._series[code] = _Series(self.capacity)
+        return series
+
+    def ingest(self, data: pd.DataFrame) -> list[tuple[str, dict]]:
+        """写入一次推送，返回实际新增或更新的 (code, bar)，供流式推送使用"""
+        # 同一处理器会收到所有周期的 K 线推送，缓冲只保留 1min（两条转换路径内过滤 k_type）
+        if len(data) >= COLUMNAR_MIN_ROWS:
+            codes, bars = _large_frame_bars(data)
+        else:
+            codes, bars = _small_frame_bars(data)
+        if not bars:
+            return []
+        now_ms = 0
+        for bar in bars:
+            if not bar["timestamp"]:
+                # time_key 无法解析时按接收时间记
+                now_ms = now_ms or int(time.time() * 1000)
+                bar["timestamp"] = now_ms
+
+        # 按标的分组，每个标的加一次自己的写入锁
+        grouped: dict[str, list[dict]] = {}
+        for code, bar in zip(codes, bars):
+            grouped.setdefault(code, []).append(bar)
+        counts = {"appended": 0, "updated": 0, "stale": 0}
+        written = []
+        for code, code_bars in grouped.items():
+            series = self._get_series(code)
+            with series.lock:
+                for bar in code_bars:
+                    result = series.ring.upsert(bar)
+                    counts[result] += 1
+                    if result != "stale":
+                        written.append((code, bar))
+        now = time.time()
+        with self._lock:
+            for code, code_bars in grouped.items():
+                self._last_push[code] = now
+                self._push_bars[code] = self._push_bars.get(code, 0) + len(code_bars)
+            self.pushes += 1
+            self.bars_in += len(bars)
+            self.appended += counts["appended"]
+            self.updated += counts["updated"]
+            self.stale += counts["stale"]
+        return written
+
+    def restore(self, code: str, bars: list[dict]) -> int:
+        """启动时从磁盘回填（按时间升序），不计入推送统计；返回写入根数"""
+        series = self._get_series(code)
+        written = 0
+        with series.lock:
+            for bar in bars:
+                if series.ring.upsert(bar) != "stale":
+                    written += 1
+        return written
+
+    def backfill(self, code: str, bars: list[dict]) -> list[dict]:
+        """
+        补入断线期间缺失的 K 线（按时间升序）：只填缓冲中没有的 timestamp，已有的（推送写入）不覆盖。
+        推送恢复后缺口位于缓冲中间，环形缓冲只能尾部追加，因此合并后整体重建，替换后读取方直接看到新缓冲。
+        返回实际补入的 K 线
+        """
+        series = self._get_series(code)
+        with series.lock:
+            current = view_to_klines(series.ring.window())
+            have = {b["timestamp"] for b in current}
+            added = [b for b in bars if b["timestamp"] not in have]
+            if not added:
+                return []
+            merged = sorted(current + added, key=lambda b: b["timestamp"])[-self.capacity:]
+            ring = KlineRing(self.capacity)
+            for bar in merged:
+                ring.upsert(bar)
+            series.ring = ring
+        with self._lock:
+            self.backfilled += len(added)
+        return added
+
+    def push_counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._push_bars)
+
+    def push_age(self, code: str, now: float | None = None) -> float | None:
+        """距最近一次推送的秒数；从未收到推送时为 None"""
+        last = self._last_push.get(code)
+        if last is None:
+            return None
+        return (now or time.time()) - last
+
+    def symbols(self) -> list[str]:
+        return list(self._series)
+
+    def snapshot(self, code: str, since: int | None = None, limit: int | None = None) -> np.ndarray:
+        """不加锁复制所需窗口；与写入冲突多次时才退回加锁读取"""
+        series = self._series.get(code)
+        self.reads += 1
+        if series is None:
+            return EMPTY_VIEW
+        view = series.ring.snapshot(since, limit)
+        if view is None:
+            self.read_fallbacks += 1
+            with series.lock:
+                view = series.ring.since(since, limit).copy()
+        return view
+
+    def read(self, code: str, since: int | None = None, limit: int | None = None) -> list[dict]:
+        """缓冲中 timestamp >= since 的最后 limit 根 K 线"""
+        return view_to_klines(self.snapshot(code, since, limit))
+
+    def read_columns(self, code: str, since: int | None = None, limit: int | None = None) -> dict[str, list]:
+        """同 read，直接按列输出，省去逐行 dict"""
+        return view_to_columns(self.snapshot(code, since, limit))
+
+    def read_since(self, code: str, since: int) -> list[dict]:
+        return self.read(code, since=since)
+
+    def stats(self) -> dict:
+        series = dict(self._series)
+        depth = {code: len(s.ring) for code, s in series.items()}
+        return {
+            "symbols": len(depth),
+            "capacity": self.capacity,
+            "bytes": sum(s.ring.nbytes for s in series.values()),
+            "depth": depth,
+            "pushes": self.pushes,
+            "bars_in": self.bars_in,
+            "appended": self.appended,
+            "updated": self.updated,
+            "stale": self.stale,
+            "reads": self.reads,
+            "read_fallbacks": self.read_fallbacks,
+            "backfilled": self.backfilled,
+        }
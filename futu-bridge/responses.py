@@ -0,0 +1,37 @@
+"""
+高速 JSON 响应
+路由直接返回 FastJSONResponse 时 FastAPI 不再走 jsonable_encoder 逐个遍历每根 K 线的 dict；
+安装了 orjson 则用 orjson 编码，否则回退到与 Starlette JSONResponse 相同参数的标准库 json。
+编码耗时计入当前请求的 serialize 分段（见 metrics），剖析中的请求记为 encode_json 分段（见 profiler）。
+"""
+
+import json
+import time
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from metrics import add_serialize
+from profiler import phase
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        t0 = time.perf_counter()
+        with phase("encode_json"):
+            body = dumps(content)
+        add_serialize(time.perf_counter() - t0)
+        return body
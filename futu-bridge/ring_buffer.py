@@ -0,0 +1,113 @@
+"""
+定长 K 线环形缓冲（NumPy 结构化数组）
+每根 K 线 56 字节，预分配 2 × capacity 槽位，每次写入同时写 i 与 i + capacity（镜像），
+任意长度不超过 capacity 的最近窗口都是一段连续内存，读取直接切片视图，无需拼接。
+时间戳单调递增，since 查询用 searchsorted 二分定位。
+读写采用版本号（seqlock）协议：写入前后各将 version 加 1（写入期间为奇数），
+读取方复制视图后核对版本号，不一致则重试，读取方从不阻塞写入方。
+本类不加锁，多个写入方之间的互斥由调用方负责。
+"""
+
+import numpy as np
+
+from kline_format import KLINE_FIELDS
+
+BAR_DTYPE = np.dtype([
+    ("timestamp", "i8"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "i8"),
+    ("turnover", "f8"),
+])
+
+
+class KlineRing:
+    __slots__ = ("capacity", "version", "_data", "_start", "_size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity * 2, dtype=BAR_DTYPE)
+        # 逻辑第 0 根在物理数组中的位置（0 <= _start < capacity）
+        self._start = 0
+        self._size = 0
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def window(self) -> np.ndarray:
+        """全部有效 K 线的连续视图（按时间升序），零拷贝"""
+        return self._data[self._start:self._start + self._size]
+
+    def last_timestamp(self) -> int | None:
+        return int(self._data[self._start + self._size - 1]["timestamp"]) if self._size else None
+
+    def _write(self, logical: int, row: tuple):
+        pos = (self._start + logical) % self.capacity
+        self._data[pos] = row
+        self._data[pos + self.capacity] = row
+
+    def upsert(self, bar: dict) -> str:
+        """写入一根 K 线：新 K 线追加，同 timestamp 覆盖；返回 appended / updated / stale"""
+        row = tuple(bar[f] for f in KLINE_FIELDS)
+        ts = row[0]
+        last = self.last_timestamp()
+        if last is None or ts > last:
+            self.version += 1
+            if self._size < self.capacity:
+                self._write(self._size, row)
+                self._size += 1
+            else:
+                # 满了覆盖最旧的一根
+                self._write(self._size, row)
+                self._start = (self._start + 1) % self.capacity
+            self.version += 1
+            return "appended"
+        if ts == last:
+            idx = self._size - 1
+        else:
+            # 乱序推送：二分查找同一根 K 线覆盖
+            ts_col = self.window()["timestamp"]
+            idx = int(np.searchsorted(ts_col, ts))
+            if idx >= self._size or ts_col[idx] != ts:
+                return "stale"
+        self.version += 1
+        self._write(idx, row)
+        self.version += 1
+        return "updated"
+
+    def since(self, since: int | None = None, limit: int | None = None) -> np.ndarray:
+        """timestamp >= since 的连续视图，limit 取最后 limit 根；零拷贝"""
+        view = self.window()
+        if since is not None:
+            view = view[int(np.searchsorted(view["timestamp"], since)):]
+        if limit is not None and len(view) > limit:
+            view = view[len(view) - limit:]
+        return view
+
+    def snapshot(self, since: int | None = None, limit: int | None = None, retries: int = 8) -> np.ndarray | None:
+        """不加锁读取 since() 的独立副本；连续 retries 次与写入冲突时返回 None，由调用方加锁重读"""
+        for _ in range(retries):
+            v = self.version
+            if v & 1:
+                continue
+            out = self.since(since, limit).copy()
+            if self.version == v:
+                return out
+        return None
+
+
+def view_to_columns(view: np.ndarray) -> dict[str, list]:
+    """结构化数组视图 → 字段 → Python 列表（与 klines_to_columns 输出相同）"""
+    return {f: view[f].tolist() for f in KLINE_FIELDS}
+
+
+def view_to_klines(view: np.ndarray) -> list[dict]:
+    cols = view_to_columns(view)
+    return [dict(zip(KLINE_FIELDS, vals)) for vals in zip(*(cols[f] for f in KLINE_FIELDS))]
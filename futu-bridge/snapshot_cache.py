@@ -0,0 +1,131 @@
+"""
+/snapshot 按标的短 TTL 缓存 + 合并回源（single-flight）
+每个标的的快照单独缓存 ttl 秒；请求中已过期或未缓存的标的才回源，
+正在回源中的标的不重复请求，并发请求共享同一次 FutuOpenD 调用的结果。
+需要回源的标的按 chunk_size（FutuOpenD 单次快照代码数上限）切块，各块并发回源，
+每块各自成功或失败：某块失败时其他块照常写入缓存，重试只需再拉失败的块。
+回源在独立任务中执行，发起请求的连接断开不会取消其他请求等待的调用。
+仅在事件循环线程内访问，无需加锁。
+"""
+
+import asyncio
+import os
+import time
+
+
+class _Entry:
+    __slots__ = ("row", "fetched_at")
+
+    def __init__(self, row: dict, fetched_at: float):
+        self.row = row
+        self.fetched_at = fetched_at
+
+
+class SnapshotCache:
+    def __init__(self, ttl: float, max_entries: int, chunk_size: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.chunk_size = chunk_size
+        self._entries: dict[str, _Entry] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    @classmethod
+    def from_env(cls) -> "SnapshotCache":
+        """
+        SNAPSHOT_CACHE_TTL: 单个标的快照缓存秒数，0 为不缓存（仍合并并发请求）
+        SNAPSHOT_CACHE_MAX: 缓存标的数上限，超出时清理过期项
+        SNAPSHOT_CHUNK_SIZE: 单次回源的标的数上限（FutuOpenD 为 400）
+        """
+        return cls(
+            ttl=float(os.getenv("SNAPSHOT_CACHE_TTL", "1")),
+            max_entries=int(os.getenv("SNAPSHOT_CACHE_MAX", "10000")),
+            chunk_size=int(os.getenv("SNAPSHOT_CHUNK_SIZE", "400")),
+        )
+
+    async def get(self, codes: list[str], fetch) -> dict[str, dict]:
+        """
+        返回 code → 快照行；FutuOpenD 未返回的标的不在结果中。
+        fetch(codes) 为协程，每块调用一次，返回 code → 快照行，失败时抛出的异常传给等待该块的所有请求；
+        任一块失败时本次请求抛出第一个异常（其余块已写入缓存）。
+        """
+        now = time.monotonic()
+        result: dict[str, dict] = {}
+        waits: dict[str, asyncio.Future] = {}
+        missing: list[str] = []
+        for code in dict.fromkeys(codes):
+            entry = self._entries.get(code)
+            if entry is not None and now - entry.fetched_at < self.ttl:
+                result[code] = entry.row
+                self.hits += 1
+            elif code in self._inflight:
+                waits[code] = self._inflight[code]
+                self.coalesced += 1
+            else:
+                missing.append(code)
+                self.misses += 1
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            for code in missing:
+                waits[code] = self._inflight[code] = loop.create_future()
+            for i in range(0, len(missing), self.chunk_size):
+                self.upstream_calls += 1
+                task = asyncio.create_task(self._fetch(missing[i:i + self.chunk_size], fetch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+        # shield：单个请求被取消时不影响同一 future 上的其他等待方
+        rows = await asyncio.gather(*(asyncio.shield(fut) for fut in waits.values()))
+        for code, row in zip(waits, rows):
+            if row is not None:
+                result[code] = row
+        return result
+
+    async def _fetch(self, codes: list[str], fetch):
+        try:
+            rows = await fetch(codes)
+        except BaseException as e:
+            self.upstream_errors += 1
+            err = e if isinstance(e, Exception) else RuntimeError(f"快照回源被中断: {e!r}")
+            for code in codes:
+                fut = self._inflight.pop(code)
+                fut.set_exception(err)
+                # 没有等待方时避免 "exception was never retrieved" 告警
+                fut.exception()
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        now = time.monotonic()
+        if len(self._entries) + len(rows) > self.max_entries:
+            self._evict(now)
+        for code in codes:
+            row = rows.get(code)
+            if row is not None:
+                self._entries[code] = _Entry(row, now)
+            self._inflight.pop(code).set_result(row)
+
+    def _evict(self, now: float):
+        expired = [code for code, e in self._entries.items() if now - e.fetched_at >= self.ttl]
+        for code in expired:
+            del self._entries[code]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "inflight": len(self._inflight),
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+        }
@@ -0,0 +1,245 @@
+"""
+FutuOpenD 实时订阅管理
+按 (code, subtype) 引用计数：首次 acquire 时向 FutuOpenD 订阅，release 到 0 后进入空闲，
+空闲超过 idle_ttl（且已满足 FutuOpenD 订阅至少 1 分钟才能退订的限制）由后台任务退订。
+订阅前按 query_subscription 的剩余额度校验，额度不足直接拒绝，不做部分订阅。
+常驻标的（pinned）永不过期。
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from futu import RET_OK, SubType
+
+log = logging.getLogger("futu-bridge")
+
+SUBTYPES = {
+    name: getattr(SubType, name)
+    for name in ("QUOTE", "TICKER", "ORDER_BOOK", "RT_DATA", "BROKER",
+                 "K_1M", "K_3M", "K_5M", "K_15M", "K_30M", "K_60M", "K_DAY", "K_WEEK")
+}
+
+# FutuOpenD 规定订阅满 1 分钟后才能退订
+MIN_HOLD_SECONDS = 60
+
+
+class QuotaExceededError(RuntimeError):
+    """订阅额度不足（路由层转为 429）"""
+
+
+class _Sub:
+    __slots__ = ("refs", "pinned", "subscribed_at", "idle_since")
+
+    def __init__(self, pinned: bool):
+        self.refs = 0
+        self.pinned = pinned
+        self.subscribed_at = time.time()
+        self.idle_since: float | None = None
+
+
+class SubscriptionManager:
+    def __init__(self, call, idle_ttl: float, reap_interval: float, quota_reserve: int):
+        """call(method, *args, **kwargs) 为协程，在执行层中调用 quote_ctx.<method>"""
+        self._call = call
+        self.idle_ttl = idle_ttl
+        self.reap_interval = reap_interval
+        self.quota_reserve = quota_reserve
+        self._subs: dict[tuple[str, str], _Sub] = {}
+        self._lock = asyncio.Lock()
+        self._reaper: asyncio.Task | None = None
+        self.expired = 0
+        self.rejected = 0
+        self.resubscribed = 0
+
+    @classmethod
+    def from_env(cls, call) -> "SubscriptionManager":
+        """
+        SUB_IDLE_TTL: 引用归零后保留订阅的秒数
+        SUB_REAP_INTERVAL: 空闲订阅回收检查间隔（秒）
+        SUB_QUOTA_RESERVE: 预留不使用的订阅额度
+        """
+        return cls(
+            call,
+            idle_ttl=float(os.getenv("SUB_IDLE_TTL", "300")),
+            reap_interval=float(os.getenv("SUB_REAP_INTERVAL", "30")),
+            quota_reserve=int(os.getenv("SUB_QUOTA_RESERVE", "10")),
+        )
+
+    @staticmethod
+    def validate_subtypes(subtypes: list[str]) -> list[str]:
+        names = [t.upper() for t in subtypes]
+        bad = [t for t in names if t not in SUBTYPES]
+        if bad:
+            raise ValueError(f"不支持的 subtype: {bad}，支持: {list(SUBTYPES)}")
+        return names
+
+    def is_subscribed(self, code: str, subtype: str) -> bool:
+        return (code, subtype) in self._subs
+
+    def subscribed_at(self, code: str, subtype: str) -> float | None:
+        sub = self._subs.get((code, subtype))
+        return sub.subscribed_at if sub is not None else None
+
+    def touch(self, code: str):
+        """读取实时数据时调用：仍在被轮询的空闲订阅重新计时"""
+        now = time.time()
+        for (c, _), sub in self._subs.items():
+            if c == code and sub.idle_since is not None:
+                sub.idle_since = now
+
+    async def quota(self) -> dict:
+        ret, data = await self._call("query_subscription")
+        if ret != RET_OK:
+            raise RuntimeError(f"FutuOpenD 查询订阅额度失败: {data}")
+        return data
+
+    async def acquire(self, codes: list[str], subtypes: list[str], pinned: bool = False) -> list[dict]:
+        """对每个 (code, subtype) 引用 +1，未订阅的先向 FutuOpenD 订阅"""
+        codes = list(dict.fromkeys(codes))
+        subtypes = list(dict.fromkeys(self.validate_subtypes(subtypes)))
+        async with self._lock:
+            missing = [(c, t) for t in subtypes for c in codes if (c, t) not in self._subs]
+            if missing:
+                quota = await self.quota()
+                remain = int(quota.get("remain", 0)) - self.quota_reserve
+                if len(missing) > remain:
+                    self.rejected += 1
+                    raise QuotaExceededError(f"订阅额度不足: 需要 {len(missing)}，可用 {max(remain, 0)}")
+                added: list[tuple[str, str]] = []
+                try:
+                    for t in subtypes:
+                        new_codes = [c for c, st in missing if st == t]
+                        if not new_codes:
+                            continue
+                        ret, err = await self._call("subscribe", new_codes, [SUBTYPES[t]], subscribe_push=True)
+                        if ret != RET_OK:
+                            raise RuntimeError(f"FutuOpenD 订阅失败: {err}")
+                        for c in new_codes:
+                            self._subs[(c, t)] = _Sub(pinned)
+                            added.append((c, t))
+                        log.info(f"订阅成功: {t} {new_codes}")
+                except BaseException:
+                    # 调用方收到错误不会 release：本次已订阅成功的部分按空闲处理，由 reap 到期退订
+                    now = time.time()
+                    for key in added:
+                        sub = self._subs[key]
+                        sub.pinned = False
+                        sub.idle_since = now
+                    raise
+
+            for t in subtypes:
+                for c in codes:
+                    sub = self._subs[(c, t)]
+                    sub.refs += 1
+                    sub.idle_since = None
+                    sub.pinned = sub.pinned or pinned
+            return [self._describe(c, t) for t in subtypes for c in codes]
+
+    def codes(self, subtype: str) -> list[str]:
+        return [c for c, t in self._subs if t == subtype]
+
+    async def resubscribe(self) -> int:
+        """
+        连接重建后按当前订阅表重新向 FutuOpenD 订阅（已订阅的重复订阅无副作用），
+        subscribed_at 更新为当前时间：重连前后推送可能断档，依赖它的派生 K 线与指标据此重建
+        """
+        async with self._lock:
+            grouped: dict[str, list[str]] = {}
+            for c, t in self._subs:
+                grouped.setdefault(t, []).append(c)
+            for t, codes in grouped.items():
+                ret, err = await self._call("subscribe", codes, [SUBTYPES[t]], subscribe_push=True)
+                if ret != RET_OK:
+                    raise RuntimeError(f"FutuOpenD 重新订阅失败: {t} {err}")
+                now = time.time()
+                for c in codes:
+                    self._subs[(c, t)].subscribed_at = now
+            total = sum(len(codes) for codes in grouped.values())
+            self.resubscribed += total
+            return total
+
+    async def release(self, codes: list[str], subtypes: list[str]) -> list[dict]:
+        """引用 -1，归零后开始空闲计时，由后台任务退订"""
+        codes = list(dict.fromkeys(codes))
+        subtypes = list(dict.fromkeys(self.validate_subtypes(subtypes)))
+        now = time.time()
+        result = []
+        for t in subtypes:
+            for c in codes:
+                sub = self._subs.get((c, t))
+                if sub is None:
+                    continue
+                sub.refs = max(sub.refs - 1, 0)
+                if sub.refs == 0 and sub.idle_since is None:
+                    sub.idle_since = now
+                result.append(self._describe(c, t))
+        return result
+
+    async def reap(self):
+        """退订空闲超时的订阅（按 subtype 分组批量退订）"""
+        now = time.time()
+        async with self._lock:
+            expired: dict[str, list[str]] = {}
+            for (c, t), sub in self._subs.items():
+                if (
+                    not sub.pinned
+                    and sub.refs == 0
+                    and sub.idle_since is not None
+                    and now - sub.idle_since >= self.idle_ttl
+                    and now - sub.subscribed_at >= MIN_HOLD_SECONDS
+                ):
+                    expired.setdefault(t, []).append(c)
+            for t, codes in expired.items():
+                ret, err = await self._call("unsubscribe", codes, [SUBTYPES[t]])
+                if ret != RET_OK:
+                    log.warning(f"退订失败: {t} {codes}: {err}")
+                    continue
+                for c in codes:
+                    del self._subs[(c, t)]
+                self.expired += len(codes)
+                log.info(f"空闲订阅已退订: {t} {codes}")
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                log.warning(f"空闲订阅回收失败: {e}")
+
+    def start(self):
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+    def _describe(self, code: str, subtype: str) -> dict:
+        sub = self._subs.get((code, subtype))
+        if sub is None:
+            return {"symbol": code, "subtype": subtype, "subscribed": False}
+        return {
+            "symbol": code,
+            "subtype": subtype,
+            "subscribed": True,
+            "refs": sub.refs,
+            "pinned": sub.pinned,
+            "subscribed_at": int(sub.subscribed_at * 1000),
+            "idle_since": int(sub.idle_since * 1000) if sub.idle_since is not None else None,
+        }
+
+    def entries(self) -> list[dict]:
+        return [self._describe(c, t) for c, t in self._subs]
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._subs),
+            "idle": sum(1 for s in self._subs.values() if s.refs == 0 and not s.pinned),
+            "expired": self.expired,
+            "rejected": self.rejected,
+            "resubscribed": self.resubscribed,
+        }
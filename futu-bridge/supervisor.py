@@ -0,0 +1,161 @@
+"""
+FutuOpenD 连接监控与断线恢复
+futu-api 会自行重连断开的连接并重放自身记录的订阅，但重试间隔固定（6 秒）、重放失败只记日志，
+断线期间的推送也不会补发。这里定时巡检连接池中的每条连接：
+- 断开期间把 futu-api 的重试间隔调为已断开时长（限制在 [backoff_base, backoff_max]），等价于每次翻倍的指数退避
+- 主连接断开时调用 on_disconnect（记录各标的断线前最后一根 K 线）
+- 连接恢复（状态回到 READY 或 conn_id 变化）后重置重试间隔；主连接恢复时调用 on_reconnect
+  （重新订阅 + 补齐缺失的 K 线），失败则按指数退避在后续巡检中重试
+仅在事件循环线程内访问，无需加锁。
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from futu.common.constant import ContextStatus
+
+log = logging.getLogger("futu-bridge")
+
+
+class _ConnState:
+    __slots__ = ("conn_id", "down_since", "disconnects", "reconnects", "last_reconnect", "last_downtime",
+                 "recovery_pending", "recovery_attempts", "recovery_after", "last_error")
+
+    def __init__(self):
+        self.conn_id = None
+        self.down_since: float | None = None
+        self.disconnects = 0
+        self.reconnects = 0
+        self.last_reconnect: float | None = None
+        self.last_downtime = 0.0
+        # 主连接恢复后的重新订阅/补数据是否仍待完成
+        self.recovery_pending = False
+        self.recovery_attempts = 0
+        self.recovery_after = 0.0
+        self.last_error: str | None = None
+
+
+class ConnectionSupervisor:
+    def __init__(self, pool, on_disconnect, on_reconnect, interval: float, backoff_base: float, backoff_max: float):
+        """
+        on_disconnect() 在主连接断开被发现时调用；
+        on_reconnect(downtime) 为协程，主连接恢复后调用，失败时抛出异常
+        """
+        self._pool = pool
+        self._on_disconnect = on_disconnect
+        self._on_reconnect = on_reconnect
+        self.interval = interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._states: dict[int, _ConnState] = {}
+        self._task: asyncio.Task | None = None
+        self.recoveries = 0
+
+    @classmethod
+    def from_env(cls, pool, on_disconnect, on_reconnect) -> "ConnectionSupervisor":
+        """
+        FUTU_SUPERVISE_INTERVAL: 连接巡检间隔（秒）
+        FUTU_RECONNECT_BASE / FUTU_RECONNECT_MAX: 重连与恢复重试的退避下限/上限（秒）
+        """
+        return cls(
+            pool,
+            on_disconnect,
+            on_reconnect,
+            interval=float(os.getenv("FUTU_SUPERVISE_INTERVAL", "2")),
+            backoff_base=float(os.getenv("FUTU_RECONNECT_BASE", "1")),
+            backoff_max=float(os.getenv("FUTU_RECONNECT_MAX", "60")),
+        )
+
+    def connected(self) -> bool:
+        """主连接是否可用"""
+        for index, ctx in self._pool.connections():
+            if index == 0:
+                return ctx.status == ContextStatus.READY
+        return False
+
+    async def check(self):
+        now = time.time()
+        for index, ctx in self._pool.connections():
+            state = self._states.get(index)
+            if state is None:
+                state = self._states[index] = _ConnState()
+            if ctx.status != ContextStatus.READY:
+                if state.down_since is None:
+                    state.down_since = now
+                    state.disconnects += 1
+                    log.warning(f"FutuOpenD 行情连接 #{index} 断开（{ctx.status}），等待重连")
+                    if index == 0:
+                        self._on_disconnect()
+                ctx.reconnect_interval = min(max(self.backoff_base, now - state.down_since), self.backoff_max)
+                continue
+
+            conn_id = ctx.get_sync_conn_id()
+            if state.down_since is not None or (state.conn_id is not None and conn_id != state.conn_id):
+                state.last_downtime = now - state.down_since if state.down_since is not None else 0.0
+                state.down_since = None
+                state.reconnects += 1
+                state.last_reconnect = now
+                ctx.reconnect_interval = self.backoff_base
+                log.info(f"FutuOpenD 行情连接 #{index} 已恢复，断开 {state.last_downtime:.1f}s")
+                if index == 0:
+                    state.recovery_pending = True
+                    state.recovery_attempts = 0
+                    state.recovery_after = 0.0
+            state.conn_id = conn_id
+
+            if state.recovery_pending and now >= state.recovery_after:
+                await self._recover(state)
+
+    async def _recover(self, state: _ConnState):
+        try:
+            await self._on_reconnect(state.last_downtime)
+        except Exception as e:
+            state.recovery_attempts += 1
+            delay = min(self.backoff_base * 2 ** state.recovery_attempts, self.backoff_max)
+            state.recovery_after = time.time() + delay
+            state.last_error = str(e)
+            log.warning(f"断线恢复失败（第 {state.recovery_attempts} 次），{delay:g}s 后重试: {e}")
+            return
+        state.recovery_pending = False
+        state.last_error = None
+        self.recoveries += 1
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                log.warning(f"连接巡检失败: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "connected": self.connected(),
+            "recoveries": self.recoveries,
+            "connections": [
+                {
+                    "index": index,
+                    "down_for_s": round(now - s.down_since, 3) if s.down_since is not None else None,
+                    "disconnects": s.disconnects,
+                    "reconnects": s.reconnects,
+                    "last_reconnect": int(s.last_reconnect * 1000) if s.last_reconnect is not None else None,
+                    "last_downtime_s": round(s.last_downtime, 3),
+                    "recovery_pending": s.recovery_pending,
+                    "recovery_attempts": s.recovery_attempts,
+                    "last_error": s.last_error,
+                }
+                for index, s in sorted(self._states.items())
+            ],
+        }
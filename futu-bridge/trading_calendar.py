@@ -0,0 +1,161 @@
+"""
+交易日历缓存
+按 (market, 年份) 整年向 FutuOpenD 拉取一次交易日，合并成每个市场一份升序日期索引：
+- 区间查询：bisect 定位首尾，直接切片
+- 是否交易日 / 前后第 n 个交易日：日期 → 下标的字典，O(1) 定位后按下标偏移
+过去年份的日历不再变化，永久保留；当年及以后的年份（交易所可能追加休市安排）超过 ttl 秒重新拉取。
+FutuOpenD 不提供的年份返回空列表：空年份只在内存中保留 ttl 秒，不永久保留也不落盘。
+配置了 KlineDisk 时整年日历落盘，重启后直接从磁盘恢复。
+仅在事件循环线程内访问；同一市场的拉取串行执行，并发请求共享同一次拉取结果。
+"""
+
+import asyncio
+import bisect
+import os
+import time
+from datetime import date
+
+# 单次查询最多跨越的年份数（区间查询与前后第 n 个交易日共用）
+MAX_YEARS = 10
+
+
+class CalendarRangeError(ValueError):
+    """日期超出 FutuOpenD 可提供的日历范围（路由层转为 404）"""
+
+
+class _Market:
+    __slots__ = ("years", "days", "types", "index", "lock")
+
+    def __init__(self):
+        # 年份 → (该年交易日 [(date, type)], 拉取时间)
+        self.years: dict[int, tuple[list[tuple[str, str]], float]] = {}
+        # 所有已加载年份的交易日，升序
+        self.days: list[str] = []
+        self.types: dict[str, str] = {}
+        self.index: dict[str, int] = {}
+        self.lock = asyncio.Lock()
+
+    def rebuild(self):
+        pairs = sorted(p for days, _ in self.years.values() for p in days)
+        self.days = [d for d, _ in pairs]
+        self.types = dict(pairs)
+        self.index = {d: i for i, d in enumerate(self.days)}
+
+
+class TradingCalendar:
+    def __init__(self, ttl: float, disk=None):
+        self.ttl = ttl
+        self.disk = disk
+        self._markets: dict[str, _Market] = {}
+        self._restored: set[str] = set()
+        self.fetches = 0
+        self.disk_loads = 0
+        self.queries = 0
+
+    @classmethod
+    def from_env(cls, disk=None) -> "TradingCalendar":
+        """TRADING_CALENDAR_TTL: 当年及以后年份日历的刷新间隔（秒）"""
+        return cls(ttl=float(os.getenv("TRADING_CALENDAR_TTL", "86400")), disk=disk)
+
+    def _market(self, market: str) -> _Market:
+        m = self._markets.get(market)
+        if m is None:
+            m = self._markets[market] = _Market()
+        return m
+
+    def _fresh(self, year: int, days: list, fetched_at: float, now: float) -> bool:
+        return (days and year < date.today().year) or now - fetched_at < self.ttl
+
+    async def ensure_years(self, market: str, years, fetch):
+        """
+        确保 years 中每一年都已加载且未过期。
+        fetch(start, end) 为协程，返回 [{"time": "YYYY-MM-DD", "trade_date_type": ...}]
+        """
+        m = self._market(market)
+        async with m.lock:
+            changed = False
+            if market not in self._restored:
+                self._restored.add(market)
+                if self.disk is not None:
+                    saved = await self.disk.load_calendar(market)
+                    # 旧版本可能落盘过空年份，恢复时丢弃
+                    saved = {year: v for year, v in (saved or {}).items() if v[0]}
+                    if saved:
+                        m.years.update(saved)
+                        self.disk_loads += 1
+                        changed = True
+            now = time.time()
+            # 过期的空年份直接丢弃，避免任意年份的查询在内存中越积越多
+            for year in [y for y, (d, t) in m.years.items() if not d and not self._fresh(y, d, t, now)]:
+                del m.years[year]
+            for year in years:
+                cached = m.years.get(year)
+                if cached is not None and self._fresh(year, cached[0], cached[1], now):
+                    continue
+                rows = await fetch(f"{year}-01-01", f"{year}-12-31")
+                self.fetches += 1
+                days = sorted((r["time"], r.get("trade_date_type", "WHOLE")) for r in rows)
+                m.years[year] = (days, now)
+                changed = True
+                if self.disk is not None and days:
+                    self.disk.save_calendar(market, year, days, now)
+            if changed:
+                m.rebuild()
+        return m
+
+    async def between(self, market: str, start: str, end: str, fetch) -> list[str]:
+        """[start, end] 内的交易日（含两端）；跨越超过 MAX_YEARS 年时抛出 CalendarRangeError"""
+        if int(end[:4]) - int(start[:4]) >= MAX_YEARS:
+            raise CalendarRangeError(f"{start} ~ {end} 跨越超过 {MAX_YEARS} 年")
+        self.queries += 1
+        m = await self.ensure_years(market, range(int(start[:4]), int(end[:4]) + 1), fetch)
+        lo = bisect.bisect_left(m.days, start)
+        hi = bisect.bisect_right(m.days, end)
+        return m.days[lo:hi]
+
+    async def info(self, market: str, day: str, fetch) -> str | None:
+        """交易日类型（WHOLE / MORNING / AFTERNOON），非交易日为 None"""
+        self.queries += 1
+        m = await self.ensure_years(market, (int(day[:4]),), fetch)
+        return m.types.get(day)
+
+    async def offset(self, market: str, day: str, n: int, fetch) -> str:
+        """
+        day 之后第 n 个（n > 0）或之前第 -n 个（n < 0）交易日，不含 day 本身；
+        跨年时按需加载相邻年份
+        """
+        self.queries += 1
+        year = int(day[:4])
+        lo_year = hi_year = year
+        while True:
+            m = await self.ensure_years(market, range(lo_year, hi_year + 1), fetch)
+            i = m.index.get(day)
+            if n > 0:
+                # day 不是交易日时以它之前最后一个交易日为起点
+                base = i if i is not None else bisect.bisect_right(m.days, day) - 1
+                target = base + n
+                if target < len(m.days):
+                    return m.days[target]
+                # 已加载的最后一年为空说明 FutuOpenD 尚未提供更晚的日历
+                if not m.years[hi_year][0] or hi_year - year >= MAX_YEARS:
+                    raise CalendarRangeError(f"{day} 之后第 {n} 个交易日超出日历范围")
+                hi_year += 1
+            else:
+                base = i if i is not None else bisect.bisect_left(m.days, day)
+                target = base + n
+                if target >= 0:
+                    return m.days[target]
+                if not m.years[lo_year][0] or year - lo_year >= MAX_YEARS:
+                    raise CalendarRangeError(f"{day} 之前第 {-n} 个交易日超出日历范围")
+                lo_year -= 1
+
+    def stats(self) -> dict:
+        return {
+            "markets": {
+                market: {"years": sorted(m.years), "days": len(m.days)}
+                for market, m in self._markets.items()
+            },
+            "fetches": self.fetches,
+            "disk_loads": self.disk_loads,
+            "queries": self.queries,
+        }
@@ -0,0 +1,76 @@
+"""
+K 线响应的线上格式
+- json（默认）：每根 K 线一个对象，与既有调用方完全兼容
+- columnar：data 改为字段 → 数组的并行数组，省去每行重复的键名
+- msgpack：columnar 结构的 MessagePack 二进制编码
+通过 ?format= 或 Accept 头选择，显式 format 参数优先。
+"""
+
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from kline_format import KLINE_FIELDS, columns_to_klines
+from metrics import add_serialize
+from profiler import phase
+from responses import FastJSONResponse
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，未安装时 msgpack 格式返回 406
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+FORMATS = ("json", "columnar", "msgpack")
+
+
+def resolve_format(fmt: str | None, accept: str | None) -> str:
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"不支持的 format: {fmt}，支持: {list(FORMATS)}")
+        return fmt
+    if accept and any(t in accept for t in MSGPACK_MEDIA_TYPES):
+        return "msgpack"
+    return "json"
+
+
+def klines_to_columns(klines: list[dict]) -> dict[str, list]:
+    return {f: [k[f] for k in klines] for f in KLINE_FIELDS}
+
+
+def render_klines(meta: dict, klines: list[dict], fmt: str):
+    """meta 为 source/symbol 等头部字段"""
+    if fmt == "json":
+        return FastJSONResponse({**meta, "count": len(klines), "data": klines})
+    with phase("klines_to_columns"):
+        cols = klines_to_columns(klines)
+    return render_kline_columns(meta, cols, fmt)
+
+
+def render_kline_columns(meta: dict, cols: dict[str, list], fmt: str):
+    """数据源本身是列式（如实时环形缓冲）时使用，columnar/msgpack 不经过逐行 dict"""
+    count = len(cols[KLINE_FIELDS[0]])
+    if fmt == "json":
+        with phase("columns_to_klines"):
+            klines = columns_to_klines(cols)
+        return FastJSONResponse({**meta, "count": count, "data": klines})
+
+    payload = {
+        **meta,
+        "count": count,
+        "format": "columnar",
+        "fields": list(KLINE_FIELDS),
+        "data": cols,
+    }
+    if fmt == "columnar":
+        return FastJSONResponse(payload)
+
+    if msgpack is None:
+        raise HTTPException(status_code=406, detail="msgpack 未安装，无法返回二进制格式")
+    t0 = time.perf_counter()
+    with phase("encode_msgpack"):
+        body = msgpack.packb(payload, use_bin_type=True)
+    add_serialize(time.perf_counter() - t0)
+    return Response(content=body, media_type=MSGPACK_MEDIA_TYPES[0])